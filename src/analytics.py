@@ -0,0 +1,173 @@
+"""
+Event analytics
+
+Counts event views and clicks in memory and periodically flushes the
+aggregated deltas to the event_stats table in one batched upsert, so the
+read path never writes to SQLite. Counters are sharded by thread, each shard
+with its own lock, so concurrent requests rarely contend.
+"""
+
+import atexit
+import itertools
+import threading
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from db import db
+from db import Event
+from db import EventStats
+
+KINDS = ("views", "clicks")
+
+
+class ShardedCounter:
+    """
+    In-memory (event id, kind) -> count deltas, split across shards
+    """
+
+    def __init__(self, shards=16):
+        """
+        Initializes a ShardedCounter object
+        """
+        self._counts = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        # each thread is assigned a shard round-robin on its first add
+        self._local = threading.local()
+        self._next_shard = itertools.count()
+
+    def add(self, event_id, kind, amount=1):
+        """
+        Adds amount to the count of kind for event_id
+        """
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = next(self._next_shard) % len(self._counts)
+        key = (event_id, kind)
+        with self._locks[shard]:
+            counts = self._counts[shard]
+            counts[key] = counts.get(key, 0) + amount
+
+    def discard(self, event_id):
+        """
+        Drops the pending counts of event_id
+        """
+        for shard, lock in enumerate(self._locks):
+            with lock:
+                counts = self._counts[shard]
+                for kind in KINDS:
+                    counts.pop((event_id, kind), None)
+
+    def drain(self):
+        """
+        Returns {event_id: {kind: delta}} accumulated so far and resets the
+        counters
+        """
+        totals = {}
+        for shard, lock in enumerate(self._locks):
+            with lock:
+                counts = self._counts[shard]
+                self._counts[shard] = {}
+            for (event_id, kind), amount in counts.items():
+                stats = totals.setdefault(event_id, dict.fromkeys(KINDS, 0))
+                stats[kind] += amount
+        return totals
+
+
+class Analytics:
+    """
+    Buffers view/click counts and flushes them every `interval` seconds
+    """
+
+    def __init__(self, interval=10):
+        """
+        Initializes an Analytics object
+        """
+        self.app = None
+        self.interval = interval
+        self.counter = ShardedCounter()
+        self._flusher = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Binds analytics to a Flask app and flushes pending counts on shutdown
+        """
+        self.app = app
+        self.interval = app.config.get("ANALYTICS_FLUSH_INTERVAL", self.interval)
+        atexit.register(self.shutdown)
+
+    def record(self, event_id, kind="views"):
+        """
+        Counts one view or click of an event
+        """
+        self.counter.add(event_id, kind)
+        if self._flusher is None:
+            self._start()
+
+    def discard(self, event_id):
+        """
+        Forgets the pending counts of a deleted event, so they are not written
+        to a later event that reuses its id
+        """
+        self.counter.discard(event_id)
+
+    def flush(self):
+        """
+        Writes pending deltas to event_stats in one upsert. Deltas of events
+        deleted since they were counted are dropped. Returns the number of
+        events updated
+        """
+        totals = self.counter.drain()
+        if not totals:
+            return 0
+        statement = insert(EventStats.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=["event_id"],
+            set_={kind: getattr(EventStats.__table__.c, kind) + getattr(statement.excluded, kind) for kind in KINDS}
+        )
+        rows = [dict(stats, event_id=event_id) for event_id, stats in totals.items()]
+        try:
+            with self.app.app_context():
+                db.session.execute(statement, rows)
+                # events deleted while their counts were being drained
+                db.session.execute(
+                    EventStats.__table__.delete()
+                    .where(EventStats.event_id.in_(list(totals)))
+                    .where(EventStats.event_id.notin_(select(Event.id)))
+                )
+                db.session.commit()
+        except Exception:
+            # keep the deltas for the next flush
+            for event_id, stats in totals.items():
+                for kind, amount in stats.items():
+                    if amount:
+                        self.counter.add(event_id, kind, amount)
+            raise
+        return len(rows)
+
+    def shutdown(self):
+        """
+        Stops the flusher thread and writes whatever is still pending
+        """
+        self._stop.set()
+        if self.app is not None:
+            try:
+                self.flush()
+            except Exception as e:
+                print("final analytics flush failed: %s" % e)
+
+    def _start(self):
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="analytics", daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print("analytics flush failed: %s" % e)
+
+
+analytics = Analytics()
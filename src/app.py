@@ -1,28 +1,107 @@
 import json
 from db import db
-from flask import Flask, request
+from flask import Blueprint, Flask, request
 from db import User
 from db import Event
 from db import Category
+from db import Subscription
+from db import EventStats
+from db import slugify
 import os
 import users_dao
+import compression
+import cache
+import changelog
+import dedupe
+import mail
+import migrations
+import read_models
+import fanout
+import intervals
+import recurrence
+import rollups
+from group_commit import writer
+from analytics import analytics
+from idempotency import idempotent
 import datetime 
-# using SendGrid's Python Library
-# https://github.com/sendgrid/sendgrid-python
-import sendgrid
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from sqlalchemy.exc import IntegrityError
 
-app = Flask(__name__)
 db_filename = "cms.db"
 
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///%s" % db_filename
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ECHO"] = True
-
-db.init_app(app)
-with app.app_context():
-    db.create_all()
+api = Blueprint("api", __name__)
+
+# serialized Event/User/Category objects keyed by (table name, id)
+entity_cache = cache.BoundedCache()
+# facet counts of /api/events/query/ keyed by filter signature
+facet_cache = cache.BoundedCache(max_size=256)
+# session token expirations keyed by token; only used with the shared cache,
+# since a per-process copy would miss logouts handled by other workers
+session_cache = None
+
+def create_app(config=None):
+    """
+    Application factory: creates and configures the Flask app
+
+    The database schema is not created here; run `flask --app app init-db`
+    (or `python app.py init-db`) once before serving
+    """
+    app = Flask(__name__)
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///%s" % db_filename
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ECHO"] = True
+    app.config["ENTITY_CACHE_SIZE"] = int(os.environ.get("ENTITY_CACHE_SIZE", 1024))
+    app.config["ENTITY_CACHE_POLICY"] = os.environ.get("ENTITY_CACHE_POLICY", "lru")
+    app.config["GROUP_COMMIT"] = os.environ.get("GROUP_COMMIT") == "1"
+    # SQLite file holding the caches shared by all worker processes; unset
+    # keeps them in process memory
+    app.config["SHARED_CACHE_PATH"] = os.environ.get("SHARED_CACHE_PATH")
+    if config is not None:
+        app.config.update(config)
+
+    db.init_app(app)
+    global entity_cache, facet_cache, session_cache
+    if app.config["SHARED_CACHE_PATH"]:
+        entity_cache = cache.SharedCache(app.config["SHARED_CACHE_PATH"], max_size=app.config["ENTITY_CACHE_SIZE"])
+        facet_cache = cache.SharedCache(app.config["SHARED_CACHE_PATH"], max_size=256, namespace="facet")
+        session_cache = cache.SharedCache(
+            app.config["SHARED_CACHE_PATH"], max_size=app.config["ENTITY_CACHE_SIZE"], namespace="session"
+        )
+    else:
+        entity_cache = cache.BoundedCache(
+            max_size=app.config["ENTITY_CACHE_SIZE"],
+            policy=app.config["ENTITY_CACHE_POLICY"]
+        )
+        facet_cache = cache.BoundedCache(max_size=256)
+        session_cache = None
+    fanout.engine.init_app(app)
+    analytics.init_app(app)
+    writer.init_app(app)
+    changelog.compactor.init_app(app)
+    app.register_blueprint(api)
+
+    @app.cli.command("init-db")
+    def init_db():
+        """
+        Creates missing tables, columns and indexes
+        """
+        migrations.upgrade()
+
+    @app.cli.command("dedupe-events")
+    def dedupe_events():
+        """
+        Fingerprints existing events and removes duplicates, in small batches
+        """
+        print("fingerprinted %d events, removed %d duplicates" % migrations.dedupe_events())
+
+    @app.cli.command("compact-changes")
+    def compact_changes():
+        """
+        Removes superseded change log entries
+        """
+        print("removed %d change log entries" % changelog.compactor.compact())
+
+    return app
 
 def success_response(data, code=200):
     """
@@ -49,9 +128,75 @@ def extract_token(request):
         return False, json.dumps({"error": "Invalid auth header"})
     return True, bearer_token
 
+def get_serialized(model, entity_id):
+    """
+    Helper function that returns a serialized object by id, reading through
+    the entity cache. Returns None if the object does not exist
+    """
+    key = (model.__tablename__, entity_id)
+    data = entity_cache.get(key)
+    if data is None:
+        version = entity_cache.version(key)
+        entity = model.query.filter_by(id = entity_id).first()
+        if entity is None:
+            return None
+        data = entity.serialize()
+        entity_cache.set(key, data, version)
+    return data
+
+def invalidate_session(session_token):
+    """
+    Helper function that drops the cached expiration of a session token
+    """
+    if session_cache is not None:
+        session_cache.delete(session_token)
+
+class SchedulingConflict(Exception):
+    """
+    Raised inside a write when the booked address is already taken
+    """
+
+    def __init__(self, conflicts):
+        super().__init__("Scheduling conflict at this address")
+        self.conflicts = conflicts
+
+
+def conflict_response(conflicts):
+    """
+    Helper function that returns the 409 response for a booking that
+    overlaps the serialized Events in conflicts
+    """
+    return json.dumps({
+        "error": "Scheduling conflict at this address",
+        "conflicts": conflicts
+    }, default=str), 409
+
+
+def booking_conflicts(address, start, end):
+    """
+    Helper function that returns the serialized Events at address overlapping
+    [start, end), including occurrences of recurring Events. Raises
+    ValueError if start or end is malformed
+    """
+    conflicts = [event.serialize() for event in intervals.find_conflicts(address, start, end)]
+    seen = {event["id"] for event in conflicts}
+    conflicts += [event for event in recurrence.series_conflicts(address, start, end) if event["id"] not in seen]
+    return conflicts
+
+def invalidate_category(name):
+    """
+    Helper function that drops a cached Category (which embeds its Events)
+    given its name
+    """
+    if name is None:
+        return
+    category = Category.query.filter_by(name = name).first()
+    if category is not None:
+        entity_cache.delete((Category.__tablename__, category.id))
+
 
 
-@app.route("/")
+@api.route("/")
 def hello():
     """
     Endpoint for printing welcome message!
@@ -60,18 +205,21 @@ def hello():
 
 # -- EVENT ROUTES ------------------------------------------------------
   
-@app.route("/api/events/")
+@api.route("/api/events/")
 def get_events():
     """
     Endpoint for getting all events
     """
-    events = [event.serialize() for event in Event.query.all()]
-    return success_response({"events": events})
+    events = [event.serialize() for event in read_models.events()]
+    return compression.compressed_response({"events": events})
 
-@app.route("/api/events/", methods=["POST"])
+@api.route("/api/events/", methods=["POST"])
+@idempotent
 def create_event():
     """
-    Endpoint for creating a new event
+    Endpoint for creating a new event. Reposting an existing event (same
+    title, address, start, end and host, ignoring case, spacing and
+    punctuation) creates nothing and returns the existing event with 200
     """
     body = json.loads(request.data)
 
@@ -96,6 +244,26 @@ def create_event():
     elif not body.get("category"):
         return failure_response("Missing category field in the body", 400)
 
+    rule = None
+    if body.get("recurrence"):
+        try:
+            rule = recurrence.parse_rule(body.get("recurrence"))
+        except ValueError as e:
+            return failure_response("Invalid recurrence: %s" % e, 400)
+
+    try:
+        fingerprint = dedupe.fingerprint(
+            body.get("title"), body.get("address"), body.get("start"), body.get("end"), body.get("host")
+        )
+        conflicts = booking_conflicts(body.get("address"), body.get("start"), body.get("end"))
+    except ValueError:
+        return failure_response("start and end must be in YYYY-MM-DD HH:MM:SS format", 400)
+    duplicate = dedupe.find_duplicate(fingerprint)
+    if duplicate is not None:
+        return success_response(duplicate.serialize())
+    if conflicts:
+        return conflict_response(conflicts)
+
     new_event = Event(
         title = body.get("title"),
         address = body.get("address"),
@@ -105,451 +273,100 @@ def create_event():
         host = body.get("host"),
         host_email = body.get("host_email"),
         free = body.get("free"),
-        category = body.get("category")
+        category = body.get("category"),
+        recurrence = body.get("recurrence") if rule else None,
+        recurrence_end = recurrence.last_start(intervals.parse_time(body.get("start")), rule) if rule else None
     )
 
-    db.session.add(new_event)
-    db.session.commit()
-
-    sg = sendgrid.SendGridAPIClient(api_key=os.environ.get('SENDGRID_API_KEY'))
-    data = {
-    "personalizations": [
-        {
-        "to": [
-            {
-            "email": host_email
-            }
-        ],
-        "subject": "Eventery Notification"
-        }
-    ],
-    "from": {
-        "email": "louisvalenciabusiness@gmail.com"
-    },
-    "content": [
-        {
-        "type": "text/html",
-        "value":'''
-        <!DOCTYPE HTML PUBLIC "-//W3C//DTD XHTML 1.0 Transitional //EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
-<html xmlns="http://www.w3.org/1999/xhtml" xmlns:v="urn:schemas-microsoft-com:vml" xmlns:o="urn:schemas-microsoft-com:office:office">
-<head>
-<!--[if gte mso 9]>
-<xml>
-  <o:OfficeDocumentSettings>
-    <o:AllowPNG/>
-    <o:PixelsPerInch>96</o:PixelsPerInch>
-  </o:OfficeDocumentSettings>
-</xml>
-<![endif]-->
-  <meta http-equiv="Content-Type" content="text/html; charset=UTF-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <meta name="x-apple-disable-message-reformatting">
-  <!--[if !mso]><!--><meta http-equiv="X-UA-Compatible" content="IE=edge"><!--<![endif]-->
-  <title></title>
-  
-    <style type="text/css">
-      @media only screen and (min-width: 570px) {
-  .u-row {
-    width: 550px !important;
-  }
-  .u-row .u-col {
-    vertical-align: top;
-  }
-
-  .u-row .u-col-100 {
-    width: 550px !important;
-  }
-
-}
-
-@media (max-width: 570px) {
-  .u-row-container {
-    max-width: 100% !important;
-    padding-left: 0px !important;
-    padding-right: 0px !important;
-  }
-  .u-row .u-col {
-    min-width: 320px !important;
-    max-width: 100% !important;
-    display: block !important;
-  }
-  .u-row {
-    width: 100% !important;
-  }
-  .u-col {
-    width: 100% !important;
-  }
-  .u-col > div {
-    margin: 0 auto;
-  }
-}
-body {
-  margin: 0;
-  padding: 0;
-}
-
-table,
-tr,
-td {
-  vertical-align: top;
-  border-collapse: collapse;
-}
-
-p {
-  margin: 0;
-}
-
-.ie-container table,
-.mso-container table {
-  table-layout: fixed;
-}
-
-* {
-  line-height: inherit;
-}
-
-a[x-apple-data-detectors='true'] {
-  color: inherit !important;
-  text-decoration: none !important;
-}
-
-table, td { color: #000000; } </style>
-  
-  
-
-</head>
-
-<body class="clean-body u_body" style="margin: 0;padding: 0;-webkit-text-size-adjust: 100%;background-color: #ccd5ae;color: #000000">
-  <!--[if IE]><div class="ie-container"><![endif]-->
-  <!--[if mso]><div class="mso-container"><![endif]-->
-  <table style="border-collapse: collapse;table-layout: fixed;border-spacing: 0;mso-table-lspace: 0pt;mso-table-rspace: 0pt;vertical-align: top;min-width: 320px;Margin: 0 auto;background-color: #ccd5ae;width:100%" cellpadding="0" cellspacing="0">
-  <tbody>
-  <tr style="vertical-align: top">
-    <td style="word-break: break-word;border-collapse: collapse !important;vertical-align: top">
-    <!--[if (mso)|(IE)]><table width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td align="center" style="background-color: #ccd5ae;"><![endif]-->
-    
-
-<div class="u-row-container" style="padding: 0px;background-color: transparent">
-  <div class="u-row" style="Margin: 0 auto;min-width: 320px;max-width: 550px;overflow-wrap: break-word;word-wrap: break-word;word-break: break-word;background-color: transparent;">
-    <div style="border-collapse: collapse;display: table;width: 100%;height: 100%;background-color: transparent;">
-      <!--[if (mso)|(IE)]><table width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td style="padding: 0px;background-color: transparent;" align="center"><table cellpadding="0" cellspacing="0" border="0" style="width:550px;"><tr style="background-color: transparent;"><![endif]-->
-      
-<!--[if (mso)|(IE)]><td align="center" width="550" style="width: 550px;padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;" valign="top"><![endif]-->
-<div class="u-col u-col-100" style="max-width: 320px;min-width: 550px;display: table-cell;vertical-align: top;">
-  <div style="height: 100%;width: 100% !important;">
-  <!--[if (!mso)&(!IE)]><!--><div style="box-sizing: border-box; height: 100%; padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;"><!--<![endif]-->
-  
-<table style="font-family:arial,helvetica,sans-serif;" role="presentation" cellpadding="0" cellspacing="0" width="100%" border="0">
-  <tbody>
-    <tr>
-      <td style="overflow-wrap:break-word;word-break:break-word;padding:10px;font-family:arial,helvetica,sans-serif;" align="left">
-        
-  <table height="0px" align="center" border="0" cellpadding="0" cellspacing="0" width="100%" style="border-collapse: collapse;table-layout: fixed;border-spacing: 0;mso-table-lspace: 0pt;mso-table-rspace: 0pt;vertical-align: top;border-top: 1px solid #BBBBBB;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%">
-    <tbody>
-      <tr style="vertical-align: top">
-        <td style="word-break: break-word;border-collapse: collapse !important;vertical-align: top;font-size: 0px;line-height: 0px;mso-line-height-rule: exactly;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%">
-          <span>&#160;</span>
-        </td>
-      </tr>
-    </tbody>
-  </table>
-
-      </td>
-    </tr>
-  </tbody>
-</table>
-
-  <!--[if (!mso)&(!IE)]><!--></div><!--<![endif]-->
-  </div>
-</div>
-<!--[if (mso)|(IE)]></td><![endif]-->
-      <!--[if (mso)|(IE)]></tr></table></td></tr></table><![endif]-->
-    </div>
-  </div>
-</div>
-
-
-
-<div class="u-row-container" style="padding: 0px;background-color: transparent">
-  <div class="u-row" style="Margin: 0 auto;min-width: 320px;max-width: 550px;overflow-wrap: break-word;word-wrap: break-word;word-break: break-word;background-color: #ffffff;">
-    <div style="border-collapse: collapse;display: table;width: 100%;height: 100%;background-color: transparent;">
-      <!--[if (mso)|(IE)]><table width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td style="padding: 0px;background-color: transparent;" align="center"><table cellpadding="0" cellspacing="0" border="0" style="width:550px;"><tr style="background-color: #ffffff;"><![endif]-->
-      
-<!--[if (mso)|(IE)]><td align="center" width="550" style="width: 550px;padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;" valign="top"><![endif]-->
-<div class="u-col u-col-100" style="max-width: 320px;min-width: 550px;display: table-cell;vertical-align: top;">
-  <div style="height: 100%;width: 100% !important;">
-  <!--[if (!mso)&(!IE)]><!--><div style="box-sizing: border-box; height: 100%; padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;"><!--<![endif]-->
-  
-<table style="font-family:arial,helvetica,sans-serif;" role="presentation" cellpadding="0" cellspacing="0" width="100%" border="0">
-  <tbody>
-    <tr>
-      <td style="overflow-wrap:break-word;word-break:break-word;padding:10px;font-family:arial,helvetica,sans-serif;" align="left">
-        
-  <h1 style="margin: 0px; color: #34495e; line-height: 170%; text-align: center; word-wrap: break-word; font-family: comic sans ms,sans-serif; font-size: 32px; font-weight: 400;"><strong>Eventery<br /></strong></h1>
-
-      </td>
-    </tr>
-  </tbody>
-</table>
-
-<table style="font-family:arial,helvetica,sans-serif;" role="presentation" cellpadding="0" cellspacing="0" width="100%" border="0">
-  <tbody>
-    <tr>
-      <td style="overflow-wrap:break-word;word-break:break-word;padding:0px 10px 20px;font-family:arial,helvetica,sans-serif;" align="left">
-        
-  <div style="color: #34495e; line-height: 140%; text-align: center; word-wrap: break-word;">
-    <p style="font-size: 14px; line-height: 140%;"><span style="font-size: 16px; line-height: 22.4px; background-color: #e9edc9;"><strong><span style="font-family: 'comic sans ms', sans-serif; line-height: 22.4px; font-size: 16px; background-color: #e9edc9;">   A New Way of Connecting with the Campus  </span></strong></span></p>
-  </div>
-
-      </td>
-    </tr>
-  </tbody>
-</table>
-
-  <!--[if (!mso)&(!IE)]><!--></div><!--<![endif]-->
-  </div>
-</div>
-<!--[if (mso)|(IE)]></td><![endif]-->
-      <!--[if (mso)|(IE)]></tr></table></td></tr></table><![endif]-->
-    </div>
-  </div>
-</div>
-
-
-
-<div class="u-row-container" style="padding: 0px;background-color: transparent">
-  <div class="u-row" style="Margin: 0 auto;min-width: 320px;max-width: 550px;overflow-wrap: break-word;word-wrap: break-word;word-break: break-word;background-color: #e9edc9;">
-    <div style="border-collapse: collapse;display: table;width: 100%;height: 100%;background-color: transparent;">
-      <!--[if (mso)|(IE)]><table width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td style="padding: 0px;background-color: transparent;" align="center"><table cellpadding="0" cellspacing="0" border="0" style="width:550px;"><tr style="background-color: #e9edc9;"><![endif]-->
-      
-<!--[if (mso)|(IE)]><td align="center" width="550" style="width: 550px;padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;" valign="top"><![endif]-->
-<div class="u-col u-col-100" style="max-width: 320px;min-width: 550px;display: table-cell;vertical-align: top;">
-  <div style="height: 100%;width: 100% !important;">
-  <!--[if (!mso)&(!IE)]><!--><div style="box-sizing: border-box; height: 100%; padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;"><!--<![endif]-->
-  
-<table style="font-family:arial,helvetica,sans-serif;" role="presentation" cellpadding="0" cellspacing="0" width="100%" border="0">
-  <tbody>
-    <tr>
-      <td style="overflow-wrap:break-word;word-break:break-word;padding:10px 20px;font-family:arial,helvetica,sans-serif;" align="left">
-        
-  <div style="color: #34495e; line-height: 180%; text-align: center; word-wrap: break-word;">
-    <p style="font-size: 14px; line-height: 180%;"><span style="font-family: 'comic sans ms', sans-serif; font-size: 20px; line-height: 36px;">Hi there,</span></p>
-<p style="font-size: 14px; line-height: 180%;"><br /><span style="font-family: 'comic sans ms', sans-serif; font-size: 16px; line-height: 28.8px;">You have successfully posted an event! We are so excited to work with you.</span></p>
-  </div>
-
-      </td>
-    </tr>
-  </tbody>
-</table>
-
-<table style="font-family:arial,helvetica,sans-serif;" role="presentation" cellpadding="0" cellspacing="0" width="100%" border="0">
-  <tbody>
-    <tr>
-      <td style="overflow-wrap:break-word;word-break:break-word;padding:10px;font-family:arial,helvetica,sans-serif;" align="left">
-        
-  <table height="0px" align="center" border="0" cellpadding="0" cellspacing="0" width="100%" style="border-collapse: collapse;table-layout: fixed;border-spacing: 0;mso-table-lspace: 0pt;mso-table-rspace: 0pt;vertical-align: top;border-top: 1px solid #ccd5ae;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%">
-    <tbody>
-      <tr style="vertical-align: top">
-        <td style="word-break: break-word;border-collapse: collapse !important;vertical-align: top;font-size: 0px;line-height: 0px;mso-line-height-rule: exactly;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%">
-          <span>&#160;</span>
-        </td>
-      </tr>
-    </tbody>
-  </table>
-
-      </td>
-    </tr>
-  </tbody>
-</table>
-
-  <!--[if (!mso)&(!IE)]><!--></div><!--<![endif]-->
-  </div>
-</div>
-<!--[if (mso)|(IE)]></td><![endif]-->
-      <!--[if (mso)|(IE)]></tr></table></td></tr></table><![endif]-->
-    </div>
-  </div>
-</div>
-
-
-
-<div class="u-row-container" style="padding: 0px;background-color: transparent">
-  <div class="u-row" style="Margin: 0 auto;min-width: 320px;max-width: 550px;overflow-wrap: break-word;word-wrap: break-word;word-break: break-word;background-color: #e9edc9;">
-    <div style="border-collapse: collapse;display: table;width: 100%;height: 100%;background-color: transparent;">
-      <!--[if (mso)|(IE)]><table width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td style="padding: 0px;background-color: transparent;" align="center"><table cellpadding="0" cellspacing="0" border="0" style="width:550px;"><tr style="background-color: #e9edc9;"><![endif]-->
-      
-<!--[if (mso)|(IE)]><td align="center" width="550" style="width: 550px;padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;" valign="top"><![endif]-->
-<div class="u-col u-col-100" style="max-width: 320px;min-width: 550px;display: table-cell;vertical-align: top;">
-  <div style="height: 100%;width: 100% !important;">
-  <!--[if (!mso)&(!IE)]><!--><div style="box-sizing: border-box; height: 100%; padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;"><!--<![endif]-->
-  
-<table style="font-family:arial,helvetica,sans-serif;" role="presentation" cellpadding="0" cellspacing="0" width="100%" border="0">
-  <tbody>
-    <tr>
-      <td style="overflow-wrap:break-word;word-break:break-word;padding:10px 10px 30px;font-family:arial,helvetica,sans-serif;" align="left">
-        
-  <h1 style="margin: 0px; color: #34495e; line-height: 140%; text-align: center; word-wrap: break-word; font-family: comic sans ms,sans-serif; font-size: 22px; font-weight: 400;">Thank You!</h1>
-
-      </td>
-    </tr>
-  </tbody>
-</table>
-
-  <!--[if (!mso)&(!IE)]><!--></div><!--<![endif]-->
-  </div>
-</div>
-<!--[if (mso)|(IE)]></td><![endif]-->
-      <!--[if (mso)|(IE)]></tr></table></td></tr></table><![endif]-->
-    </div>
-  </div>
-</div>
-
-
-
-<div class="u-row-container" style="padding: 0px;background-color: transparent">
-  <div class="u-row" style="Margin: 0 auto;min-width: 320px;max-width: 550px;overflow-wrap: break-word;word-wrap: break-word;word-break: break-word;background-color: #d4a373;">
-    <div style="border-collapse: collapse;display: table;width: 100%;height: 100%;background-color: transparent;">
-      <!--[if (mso)|(IE)]><table width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td style="padding: 0px;background-color: transparent;" align="center"><table cellpadding="0" cellspacing="0" border="0" style="width:550px;"><tr style="background-color: #d4a373;"><![endif]-->
-      
-<!--[if (mso)|(IE)]><td align="center" width="550" style="width: 550px;padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;" valign="top"><![endif]-->
-<div class="u-col u-col-100" style="max-width: 320px;min-width: 550px;display: table-cell;vertical-align: top;">
-  <div style="height: 100%;width: 100% !important;">
-  <!--[if (!mso)&(!IE)]><!--><div style="box-sizing: border-box; height: 100%; padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;"><!--<![endif]-->
-  
-<table style="font-family:arial,helvetica,sans-serif;" role="presentation" cellpadding="0" cellspacing="0" width="100%" border="0">
-  <tbody>
-    <tr>
-      <td style="overflow-wrap:break-word;word-break:break-word;padding:10px;font-family:arial,helvetica,sans-serif;" align="left">
-        
-  <div style="color: #34495e; line-height: 180%; text-align: center; word-wrap: break-word;">
-    <p style="font-size: 14px; line-height: 180%;">Want to change how you receive these emails?</p>
-<p style="font-size: 14px; line-height: 180%;">You can update your preferences or <span style="text-decoration: underline; font-size: 14px; line-height: 25.2px; color: #ffffff;"><span style="font-size: 14px; line-height: 25.2px;">unsubscribe</span></span><span style="font-size: 14px; line-height: 25.2px;">&nbsp;</span>from this list.</p>
-  </div>
-
-      </td>
-    </tr>
-  </tbody>
-</table>
-
-<table style="font-family:arial,helvetica,sans-serif;" role="presentation" cellpadding="0" cellspacing="0" width="100%" border="0">
-  <tbody>
-    <tr>
-      <td style="overflow-wrap:break-word;word-break:break-word;padding:10px;font-family:arial,helvetica,sans-serif;" align="left">
-        
-  <table height="0px" align="center" border="0" cellpadding="0" cellspacing="0" width="100%" style="border-collapse: collapse;table-layout: fixed;border-spacing: 0;mso-table-lspace: 0pt;mso-table-rspace: 0pt;vertical-align: top;border-top: 1px solid #dfdada;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%">
-    <tbody>
-      <tr style="vertical-align: top">
-        <td style="word-break: break-word;border-collapse: collapse !important;vertical-align: top;font-size: 0px;line-height: 0px;mso-line-height-rule: exactly;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%">
-          <span>&#160;</span>
-        </td>
-      </tr>
-    </tbody>
-  </table>
-
-      </td>
-    </tr>
-  </tbody>
-</table>
-
-<table style="font-family:arial,helvetica,sans-serif;" role="presentation" cellpadding="0" cellspacing="0" width="100%" border="0">
-  <tbody>
-    <tr>
-      <td style="overflow-wrap:break-word;word-break:break-word;padding:0px 10px 15px;font-family:arial,helvetica,sans-serif;" align="left">
-        
-  <div style="color: #ffffff; line-height: 140%; text-align: center; word-wrap: break-word;">
-    <p style="font-size: 14px; line-height: 140%;"><span style="font-family: 'comic sans ms', sans-serif; font-size: 12px; line-height: 16.8px;">© 2023 Eventery. All Rights Reserved.</span></p>
-  </div>
-
-      </td>
-    </tr>
-  </tbody>
-</table>
-
-  <!--[if (!mso)&(!IE)]><!--></div><!--<![endif]-->
-  </div>
-</div>
-<!--[if (mso)|(IE)]></td><![endif]-->
-      <!--[if (mso)|(IE)]></tr></table></td></tr></table><![endif]-->
-    </div>
-  </div>
-</div>
-
-
-
-<div class="u-row-container" style="padding: 0px;background-color: transparent">
-  <div class="u-row" style="Margin: 0 auto;min-width: 320px;max-width: 550px;overflow-wrap: break-word;word-wrap: break-word;word-break: break-word;background-color: transparent;">
-    <div style="border-collapse: collapse;display: table;width: 100%;height: 100%;background-color: transparent;">
-      <!--[if (mso)|(IE)]><table width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td style="padding: 0px;background-color: transparent;" align="center"><table cellpadding="0" cellspacing="0" border="0" style="width:550px;"><tr style="background-color: transparent;"><![endif]-->
-      
-<!--[if (mso)|(IE)]><td align="center" width="550" style="width: 550px;padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;" valign="top"><![endif]-->
-<div class="u-col u-col-100" style="max-width: 320px;min-width: 550px;display: table-cell;vertical-align: top;">
-  <div style="height: 100%;width: 100% !important;">
-  <!--[if (!mso)&(!IE)]><!--><div style="box-sizing: border-box; height: 100%; padding: 0px;border-top: 0px solid transparent;border-left: 0px solid transparent;border-right: 0px solid transparent;border-bottom: 0px solid transparent;"><!--<![endif]-->
-  
-<table style="font-family:arial,helvetica,sans-serif;" role="presentation" cellpadding="0" cellspacing="0" width="100%" border="0">
-  <tbody>
-    <tr>
-      <td style="overflow-wrap:break-word;word-break:break-word;padding:10px;font-family:arial,helvetica,sans-serif;" align="left">
-        
-  <table height="0px" align="center" border="0" cellpadding="0" cellspacing="0" width="100%" style="border-collapse: collapse;table-layout: fixed;border-spacing: 0;mso-table-lspace: 0pt;mso-table-rspace: 0pt;vertical-align: top;border-top: 0px solid #BBBBBB;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%">
-    <tbody>
-      <tr style="vertical-align: top">
-        <td style="word-break: break-word;border-collapse: collapse !important;vertical-align: top;font-size: 0px;line-height: 0px;mso-line-height-rule: exactly;-ms-text-size-adjust: 100%;-webkit-text-size-adjust: 100%">
-          <span>&#160;</span>
-        </td>
-      </tr>
-    </tbody>
-  </table>
-
-      </td>
-    </tr>
-  </tbody>
-</table>
-
-  <!--[if (!mso)&(!IE)]><!--></div><!--<![endif]-->
-  </div>
-</div>
-<!--[if (mso)|(IE)]></td><![endif]-->
-      <!--[if (mso)|(IE)]></tr></table></td></tr></table><![endif]-->
-    </div>
-  </div>
-</div>
-
-
-    <!--[if (mso)|(IE)]></td></tr></table><![endif]-->
-    </td>
-  </tr>
-  </tbody>
-  </table>
-  <!--[if mso]></div><![endif]-->
-  <!--[if IE]></div><![endif]-->
-</body>
-
-</html>
-        ''' 
-        }
-    ]
-    }
-    response = sg.client.mail.send.post(request_body=data)
-    print(response.status_code)
-    print(response.body)
-    print(response.headers)
-
-    return success_response(new_event.serialize(), 201)
-
-
-@app.route("/api/events/<int:event_id>/")
+    def insert_event():
+        # checked again under the write lock, in case a booking for the same
+        # slot committed since the check above
+        conflicts = booking_conflicts(new_event.address, new_event.start, new_event.end)
+        if conflicts:
+            raise SchedulingConflict(conflicts)
+        db.session.add(new_event)
+        db.session.flush()
+        intervals.index_event(new_event.id, new_event.address, new_event.start, new_event.end)
+        if new_event.recurrence:
+            intervals.index_series(
+                new_event.id, new_event.address, new_event.start, new_event.end, new_event.recurrence_end
+            )
+        rollups.event_added(new_event)
+        data = new_event.serialize()
+        changelog.record(Event.__tablename__, new_event.id, changelog.UPSERT, data)
+        return data
+
+    try:
+        event = writer.write(insert_event)
+    except IntegrityError:
+        # an identical repost was inserted since the duplicate check
+        duplicate = dedupe.find_duplicate(fingerprint)
+        if duplicate is None:
+            raise
+        return success_response(duplicate.serialize())
+    except SchedulingConflict as e:
+        return conflict_response(e.conflicts)
+    invalidate_category(event["category"])
+    facet_cache.clear()
+
+    try:
+        mail.send_event_posted(host_email)
+    except mail.MailError as e:
+        # the event is already created, so a failed confirmation is not an error
+        print("confirmation email for event %s failed: %s" % (event["id"], e))
+    fanout.engine.notify(event)
+
+    return success_response(event, 201)
+
+
+@api.route("/api/events/<int:event_id>/")
 def get_event(event_id):
     """
     Endpoint for getting an event by id
     """
-    event = Event.query.filter_by(id = event_id).first()
+    event = get_serialized(Event, event_id)
     if event is None:
         return failure_response("Event not found!")
-    return success_response(event.serialize())
+    analytics.record(event_id, "views")
+    return success_response(event)
+
+
+@api.route("/api/events/<int:event_id>/click/", methods=["POST"])
+def click_event(event_id):
+    """
+    Endpoint for recording a click on an Event (e.g. its sign-up link)
+    """
+    if get_serialized(Event, event_id) is None:
+        return failure_response("Event not found!")
+    analytics.record(event_id, "clicks")
+    return success_response({"message": "Click recorded"})
+
+
+@api.route("/api/events/popular/")
+def get_popular_events():
+    """
+    Endpoint for getting the most viewed Events with their view/click counts,
+    served from the aggregated event_stats table (counts lag by up to one
+    flush interval)
+    """
+    try:
+        limit = min(int(request.args.get("limit", 10)), 100)
+    except ValueError:
+        return failure_response("limit must be a number", 400)
+    if limit < 1:
+        return failure_response("limit must be positive", 400)
+    rows = (
+        db.session.query(Event, EventStats)
+        .join(EventStats, EventStats.event_id == Event.id)
+        .order_by(EventStats.views.desc(), Event.id)
+        .limit(limit)
+        .all()
+    )
+    events = [dict(event.serialize(), views = stats.views, clicks = stats.clicks) for event, stats in rows]
+    return success_response({"events": events})
 
 
-@app.route("/api/events/<int:event_id>/", methods=["DELETE"])
+@api.route("/api/events/<int:event_id>/", methods=["DELETE"])
 def delete_event(event_id):
     """
     Endpoint for deleting an event by id
@@ -558,15 +375,23 @@ def delete_event(event_id):
     if event is None:
         return failure_response("Event not found!")
     db.session.delete(event)
+    intervals.unindex_event(event_id)
+    rollups.event_removed(event)
+    EventStats.query.filter_by(event_id = event_id).delete()
+    changelog.record(Event.__tablename__, event_id, changelog.DELETE)
     db.session.commit()
+    analytics.discard(event_id)
+    entity_cache.delete((Event.__tablename__, event_id))
+    invalidate_category(event.category)
+    facet_cache.clear()
     return success_response(event.serialize())
 
-@app.route("/api/events/category/<string:category>/")
+@api.route("/api/events/category/<string:category>/")
 def get_events_by_category(category):
     """
     Endpoint for getting Events by Category name
     """
-    events = Event.query.filter_by(category = category)
+    events = read_models.events(Event.category == category)
 
     if events is None:
       return success_response({"message": "No events in this category found"})
@@ -578,65 +403,150 @@ def get_events_by_category(category):
 
     return success_response(events_serialized)
 
-@app.route("/api/events/host/<string:host_query>/")
+@api.route("/api/events/host/<string:host_query>/")
 def get_events_by_host(host_query):
     """
-    Endpoint for getting Events by email
+    Endpoint for getting Events by host, matched case-insensitively through
+    the host slug ("Big Host", "big-host" and "BIG-HOST" are the same host).
+    Results are paginated with ?limit= (default 50) and ?after=<last id>; a
+    Link header points to the next page
     """
-    new_host = host_query.replace("-", " ")
-    events = Event.query.filter_by(host = new_host)
+    try:
+        limit = min(int(request.args.get("limit", 50)), 200)
+        after = int(request.args.get("after", 0))
+    except ValueError:
+        return failure_response("limit and after must be numbers", 400)
+    if limit < 1:
+        return failure_response("limit must be positive", 400)
 
-    if events is None:
-      return success_response({"message": "You have no created events"})
-    
-    events_serialized = []
-
-    for row in events:
-      events_serialized.append(row.serialize())
+    events = read_models.events(Event.host_slug == slugify(host_query), Event.id > after, limit = limit)
+    events_serialized = [row.serialize() for row in events]
 
-    return success_response(events_serialized)
+    headers = {}
+    if len(events) == limit:
+        headers["Link"] = '<%s?limit=%d&after=%d>; rel="next"' % (request.path, limit, events[-1].id)
+    return json.dumps(events_serialized, default=str), 200, headers
 
-@app.route("/api/events/day/<string:day>/")
+@api.route("/api/events/day/<string:day>/")
 def get_events_by_day(day):
     """
-    Endpoint for getting Events by day (YYYY-MM-DD) format
+    Endpoint for getting Events by day (YYYY-MM-DD) format, including
+    occurrences of recurring events on that day
     """
-    events = []
-
-    for event in Event.query.all():
-      if event.start.strftime('%Y-%m-%d') == day:
-        events.append(event)
+    try:
+        window_start = datetime.datetime.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        return failure_response("day must be in YYYY-MM-DD format", 400)
+    events = recurrence.events_in_window(window_start, window_start + datetime.timedelta(days=1))
 
     if len(events) == 0:
       return success_response({"message": "No events for this day"})
-    
-    events_serialized = []
 
-    for row in events:
-      events_serialized.append(row.serialize())
-
-    return success_response(events_serialized)
+    return success_response(events)
+
+@api.route("/api/events/upcoming/")
+def get_upcoming_events():
+    """
+    Endpoint for getting Events and occurrences of recurring events starting
+    in the next `days` days (default 7), or from the `from` day (YYYY-MM-DD)
+    """
+    try:
+        days = int(request.args.get("days", 7))
+        if request.args.get("from"):
+            window_start = datetime.datetime.strptime(request.args["from"], "%Y-%m-%d")
+        else:
+            window_start = datetime.datetime.now()
+    except ValueError:
+        return failure_response("days must be a number and from in YYYY-MM-DD format", 400)
+    if not 0 < days <= 366:
+        return failure_response("days must be between 1 and 366", 400)
+
+    events = recurrence.events_in_window(window_start, window_start + datetime.timedelta(days=days))
+    return compression.compressed_response({"events": events})
+
+@api.route("/api/events/calendar/<int:year>/<int:month>/")
+def get_calendar(year, month):
+    """
+    Endpoint for getting the number of Events on each day of a month, split
+    by category with ?by_category=true
+    """
+    if not 1 <= month <= 12 or not 1 <= year <= 9999:
+        return failure_response("Invalid year or month", 400)
+    by_category = request.args.get("by_category", "").lower() == "true"
+    days = rollups.month_counts(year, month, by_category)
+    return success_response({"year": year, "month": month, "days": days})
+
+@api.route("/api/events/conflicts/")
+def get_event_conflicts():
+    """
+    Endpoint for getting the Events at an address that overlap a time range
+    (?address=...&start=YYYY-MM-DD HH:MM:SS&end=YYYY-MM-DD HH:MM:SS)
+    """
+    address = request.args.get("address")
+    start = request.args.get("start")
+    end = request.args.get("end")
+    if not address or not start or not end:
+        return failure_response("Missing address, start or end query parameter", 400)
+    try:
+        conflicts = booking_conflicts(address, start, end)
+    except ValueError:
+        return failure_response("start and end must be in YYYY-MM-DD HH:MM:SS format", 400)
+    return success_response({"conflicts": conflicts})
+
+@api.route("/api/events/query/")
+def query_events():
+    """
+    Endpoint for getting Events filtered by any combination of category
+    (repeatable), host, free and a from/to day range (YYYY-MM-DD, inclusive),
+    together with facet counts per category, free vs. paid and per day
+    """
+    categories = sorted(set(request.args.getlist("category")))
+    host = request.args.get("host")
+    free = request.args.get("free")
+    if free is not None:
+        if free.lower() not in ("true", "false"):
+            return failure_response("free must be true or false", 400)
+        free = free.lower() == "true"
+    try:
+        start_day, end_day = [
+            datetime.datetime.strptime(request.args[name], "%Y-%m-%d").date() if request.args.get(name) else None
+            for name in ("from", "to")
+        ]
+    except ValueError:
+        return failure_response("from and to must be in YYYY-MM-DD format", 400)
+
+    criteria = read_models.event_criteria(categories, host, free, start_day, end_day)
+    events = [event.serialize() for event in read_models.events(*criteria)]
+
+    signature = (tuple(categories), host, free, start_day, end_day)
+    facets = facet_cache.get(signature)
+    if facets is None:
+        version = facet_cache.version(signature)
+        facets = read_models.event_facets(*criteria)
+        facet_cache.set(signature, facets, version)
+
+    return compression.compressed_response({"events": events, "facets": facets})
 
 # -- USER ROUTES ---------------------------------------------------
-@app.route("/api/users/")
+@api.route("/api/users/")
 def get_users():
     """
     Endpoint for getting all users
     """
-    users = [user.serialize() for user in User.query.all()]
+    users = [user.serialize() for user in read_models.users()]
     return success_response({"users": users})
 
-@app.route("/api/users/<int:user_id>/")
+@api.route("/api/users/<int:user_id>/")
 def get_user(user_id):
     """
     Endpoint for getting a user by id
     """
-    user = User.query.filter_by(id = user_id).first()
+    user = get_serialized(User, user_id)
     if user is None:
         return failure_response("User not found!")
-    return success_response(user.serialize())
+    return success_response(user)
 
-@app.route("/api/users/<int:user_id>/", methods=["DELETE"])
+@api.route("/api/users/<int:user_id>/", methods=["DELETE"])
 def delete_user(user_id):
     """
     Endpoint for deleting a user by id
@@ -644,34 +554,40 @@ def delete_user(user_id):
     user = User.query.filter_by(id = user_id).first()
     if user is None:
         return failure_response("User not found!")
+    Subscription.query.filter_by(user_id = user_id).delete()
     db.session.delete(user)
+    changelog.record(User.__tablename__, user_id, changelog.DELETE)
     db.session.commit()
+    entity_cache.delete((User.__tablename__, user_id))
+    invalidate_session(user.session_token)
     return success_response(user.serialize())
 
-@app.route("/api/users/email/<string:user_email>/")
+@api.route("/api/users/email/<string:user_email>/")
 def get_user_by_email(user_email):
     """
-    Endpoint for getting a user by id
+    Endpoint for getting a user by email (case-insensitive). The legacy
+    encoding with "-" for "@" and "_" for "." is still accepted when the
+    path has no "@"
     """
-    email_correct = user_email.replace("-", "@")
-    email_correct = email_correct.replace("_", ".")
-
-    user = User.query.filter_by(email = email_correct).first()
+    user = users_dao.get_user_by_email(user_email)
+    if user is None and "@" not in user_email:
+        user = users_dao.get_user_by_email(user_email.replace("-", "@").replace("_", "."))
     if user is None:
         return failure_response("User not found!")
     return success_response(user.serialize())
 
 
 # -- Category ROUTES ---------------------------------------------------
-@app.route("/api/categories/")
+@api.route("/api/categories/")
 def get_categories():
     """
     Endpoint for getting all Categories
     """
     categories = [category.serialize() for category in Category.query.all()]
-    return success_response({"categories": categories})
+    return compression.compressed_response({"categories": categories})
 
-@app.route("/api/categories/", methods=["POST"])
+@api.route("/api/categories/", methods=["POST"])
+@idempotent
 def create_category():
     """
     Endpoint for creating a new Category
@@ -685,23 +601,28 @@ def create_category():
         name = body.get("name"),
     )
 
-    db.session.add(new_category)
-    db.session.commit()
-    return success_response(new_category.serialize(), 201)
+    def insert_category():
+        db.session.add(new_category)
+        db.session.flush()
+        data = new_category.simple_serialize()
+        changelog.record(Category.__tablename__, new_category.id, changelog.UPSERT, data)
+        return new_category.serialize()
+
+    return success_response(writer.write(insert_category), 201)
 
 
-@app.route("/api/categories/<int:category_id>/")
+@api.route("/api/categories/<int:category_id>/")
 def get_category_by_id(category_id):
     """
     Endpoint for getting a Category by id
     """
-    category = Category.query.filter_by(id = category_id).first()
+    category = get_serialized(Category, category_id)
     if category is None:
         return failure_response("Category not found!")
-    return success_response(category.serialize())
+    return success_response(category)
 
 
-@app.route("/api/categories/<int:category_id>/", methods=["DELETE"])
+@api.route("/api/categories/<int:category_id>/", methods=["DELETE"])
 def delete_category(category_id):
     """
     Endpoint for deleting a Category by id
@@ -709,12 +630,15 @@ def delete_category(category_id):
     category = Category.query.filter_by(id = category_id).first()
     if category is None:
         return failure_response("Category not found!")
+    Subscription.query.filter_by(category_id = category_id).delete()
     db.session.delete(category)
+    changelog.record(Category.__tablename__, category_id, changelog.DELETE)
     db.session.commit()
+    entity_cache.delete((Category.__tablename__, category_id))
     return success_response(category.serialize())
   
 
-@app.route("/api/events/<int:event_id>/category/", methods=["POST"])
+@api.route("/api/events/<int:event_id>/category/", methods=["POST"])
 def assign_category(event_id):
     """
     Endpoint for assigning a Category to an Event by id
@@ -733,13 +657,106 @@ def assign_category(event_id):
     category = Category.query.filter_by(name=name).first()
     if category is None:
         category = Category(name=name)
-    event.category = category
+        db.session.add(category)
+        db.session.flush()
+        changelog.record(Category.__tablename__, category.id, changelog.UPSERT, category.simple_serialize())
+    old_category = event.category
+    rollups.event_removed(event)
+    event.category = category.name
+    rollups.event_added(event)
+    if old_category != category.name:
+        changelog.record(Event.__tablename__, event_id, changelog.UPSERT, event.serialize())
     db.session.commit()
+    entity_cache.delete((Event.__tablename__, event_id))
+    entity_cache.delete((Category.__tablename__, category.id))
+    invalidate_category(old_category)
+    facet_cache.clear()
+    if old_category != category.name:
+        fanout.engine.notify(event.serialize())
     return success_response(category.serialize())
 
 
+@api.route("/api/categories/<int:category_id>/subscribers/", methods=["POST"])
+def subscribe(category_id):
+    """
+    Endpoint for subscribing a User to a Category
+    """
+    category = Category.query.filter_by(id = category_id).first()
+    if category is None:
+        return failure_response("Category not found!")
+    body = json.loads(request.data)
+    user_id = body.get("user_id")
+    if not user_id:
+        return failure_response("Missing user_id field in the body", 400)
+    if User.query.filter_by(id = user_id).first() is None:
+        return failure_response("User not found!")
+
+    subscription = Subscription.query.filter_by(category_id = category_id, user_id = user_id).first()
+    if subscription is not None:
+        return success_response(subscription.serialize())
+
+    subscription = Subscription(user_id = user_id, category_id = category_id)
+    db.session.add(subscription)
+    db.session.commit()
+    return success_response(subscription.serialize(), 201)
+
+
+@api.route("/api/categories/<int:category_id>/subscribers/<int:user_id>/", methods=["DELETE"])
+def unsubscribe(category_id, user_id):
+    """
+    Endpoint for unsubscribing a User from a Category
+    """
+    subscription = Subscription.query.filter_by(category_id = category_id, user_id = user_id).first()
+    if subscription is None:
+        return failure_response("Subscription not found!")
+    db.session.delete(subscription)
+    db.session.commit()
+    return success_response(subscription.serialize())
+
+
+@api.route("/api/fanout/")
+def get_fanout_stats():
+    """
+    Endpoint for getting fan-out notification counters
+    """
+    return success_response(dict(fanout.engine.stats, pending = fanout.engine.jobs.qsize()))
+
+
+@api.route("/api/changes/")
+def get_changes():
+    """
+    Endpoint for reading the change log incrementally: the changes after
+    ?since=<seq> (default 0), oldest first, at most ?limit= (default 100).
+    Pass the returned last_seq as since to get the next page
+    """
+    try:
+        since = int(request.args.get("since", 0))
+        limit = min(int(request.args.get("limit", 100)), 1000)
+    except ValueError:
+        return failure_response("since and limit must be numbers", 400)
+    if limit < 1:
+        return failure_response("limit must be positive", 400)
+
+    changes = [change.serialize() for change in changelog.since(since, limit)]
+    return compression.compressed_response({
+        "changes": changes,
+        "last_seq": changes[-1]["seq"] if changes else since,
+        "has_more": len(changes) == limit
+    })
+
+
+@api.route("/api/cache/")
+def get_cache_stats():
+    """
+    Endpoint for getting the entity cache size and hit/miss counters (of
+    this worker, when the cache is shared)
+    """
+    return success_response(entity_cache.stats())
+
+
 # -- USER AUTHENTICATION ROUTES ---------------------------------------------------
-@app.route("/register/", methods=["POST"])
+@api.route("/register/", methods=["POST"])
+@idempotent
 def register_account():
     """
     Endpoint for registering a new user
@@ -774,7 +791,7 @@ def register_account():
     }), 200
 
 
-@app.route("/login/", methods=["POST"])
+@api.route("/login/", methods=["POST"])
 def login():
     """
     Endpoint for logging in a user
@@ -799,7 +816,7 @@ def login():
     
 
 
-@app.route("/session/", methods=["POST"])
+@api.route("/session/", methods=["POST"])
 def update_session():
     """
     Endpoint for updating a user's session
@@ -809,20 +826,30 @@ def update_session():
     if not success:
         return update_token
 
-    user = users_dao.renew_session(update_token)
+    def renew():
+        user = users_dao.get_user_by_update_token(update_token)
+        if user is None:
+            return None
+        old_session_token = user.session_token
+        users_dao.renew_session(update_token, commit=False)
+        return old_session_token, {
+            "session_token": user.session_token,
+            "session_expiration": str(user.session_expiration),
+            "update_token": user.update_token
+        }
 
-    if user is None:
+    renewed = writer.write(renew)
+
+    if renewed is None:
         return json.dumps({"error": "Invalid update token"}), 400
-    
-    return json.dumps({
-        "session_token": user.session_token,
-        "session_expiration": str(user.session_expiration),
-        "update_token": user.update_token
-    }), 200
 
+    old_session_token, tokens = renewed
+    invalidate_session(old_session_token)
+    return json.dumps(tokens), 200
 
 
-@app.route("/secret/", methods=["GET"])
+
+@api.route("/secret/", methods=["GET"])
 def secret_message():
     """
     Endpoint for verifying a session token and returning a secret message
@@ -832,17 +859,30 @@ def secret_message():
 
     if not success:
         return session_token
-    
-    user = users_dao.get_user_by_session_token(session_token)
 
-    if user is None or not user.verify_session_token(session_token):
+    if session_cache is None:
+        user = users_dao.get_user_by_session_token(session_token)
+        if user is None or not user.verify_session_token(session_token):
+            return json.dumps({"error": "Invalid session token"}), 400
+        return json.dumps({"message": "Valid session token"}), 200
+
+    expiration = session_cache.get(session_token)
+    if expiration is None:
+        version = session_cache.version(session_token)
+        user = users_dao.get_user_by_session_token(session_token)
+        if user is None:
+            return json.dumps({"error": "Invalid session token"}), 400
+        expiration = str(user.session_expiration)
+        session_cache.set(session_token, expiration, version)
+
+    if datetime.datetime.now() >= datetime.datetime.fromisoformat(expiration):
         return json.dumps({"error": "Invalid session token"}), 400
     
     return json.dumps({"message": "Valid session token"}), 200
 
 
 
-@app.route("/logout/", methods=["POST"])
+@api.route("/logout/", methods=["POST"])
 def logout():
     """
     Endpoint for logging out a user
@@ -857,9 +897,23 @@ def logout():
     
     user.session_expiration = datetime.datetime.now()
     db.session.commit()
+    invalidate_session(session_token)
 
     return json.dumps({"message": "User has successfully logged out"})
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, debug=True)
\ No newline at end of file
+    import sys
+
+    app = create_app()
+    if sys.argv[1:] == ["init-db"]:
+        with app.app_context():
+            migrations.upgrade()
+    elif sys.argv[1:] == ["dedupe-events"]:
+        with app.app_context():
+            print("fingerprinted %d events, removed %d duplicates" % migrations.dedupe_events())
+    elif sys.argv[1:] == ["compact-changes"]:
+        with app.app_context():
+            print("removed %d change log entries" % changelog.compactor.compact())
+    else:
+        app.run(host="0.0.0.0", port=8000, debug=True)
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+Fan-out benchmark
+
+Subscribes N users to one category on a temporary database, then measures how
+long the fan-out engine takes to deliver one new event notification to all of
+them through the mock SendGrid server.
+
+Usage (from src/):
+    python -m benchmarks.fanout --subscribers 100000
+"""
+
+import argparse
+import datetime
+import os
+import tempfile
+import threading
+import time
+
+import app
+import fanout
+from benchmarks.mail_throughput import MockSendGridServer
+from db import db
+from db import Category
+from db import Subscription
+from db import User
+from mail import BatchMailer
+
+
+def populate(subscribers):
+    """
+    Creates one category and subscribers users following it
+    """
+    category = Category(name="bench")
+    db.session.add(category)
+    db.session.commit()
+    expiration = datetime.datetime.now()
+    db.session.execute(User.__table__.insert(), [
+        {
+            "email": "user%d@example.com" % i,
+            "password_digest": "",
+            "name": "User %d" % i,
+            "netid": "u%d" % i,
+            "session_token": "s%d" % i,
+            "session_expiration": expiration,
+            "update_token": "u%d" % i
+        }
+        for i in range(subscribers)
+    ])
+    db.session.execute(Subscription.__table__.insert(), [
+        {"user_id": i + 1, "category_id": category.id} for i in range(subscribers)
+    ])
+    db.session.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure fan-out latency and throughput")
+    parser.add_argument("--subscribers", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    server = MockSendGridServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        flask_app = app.create_app({
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///%s" % os.path.join(tmp, "bench.db"),
+            "SQLALCHEMY_ECHO": False,
+            "FANOUT_CHUNK_SIZE": args.chunk_size
+        })
+        engine = fanout.FanoutEngine(mailer=BatchMailer(api_key="test", api_url=server.url))
+        engine.init_app(flask_app)
+        with flask_app.app_context():
+            db.create_all()
+            populate(args.subscribers)
+
+        event = {
+            "id": 1, "title": "Bench", "address": "Room 1", "start": "2023-01-01 10:00:00",
+            "end": "2023-01-01 11:00:00", "description": "Benchmark event", "category": "bench"
+        }
+        started = time.perf_counter()
+        engine.notify(event)
+        engine.join()
+        elapsed = time.perf_counter() - started
+        with flask_app.app_context():
+            db.engine.dispose()
+
+    server.shutdown()
+    print("%d subscribers, %d chunks, %d delivered: %.2fs (%.0f recipients/s)" % (
+        args.subscribers, engine.stats["chunks"], server.recipients, elapsed, server.recipients / elapsed
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Mail throughput benchmark
+
+Runs a local mock of SendGrid's v3 mail endpoint and measures how many
+recipients per second BatchMailer delivers to it, so batching can be tested
+without an API key or network access.
+
+Usage (from src/):
+    python -m benchmarks.mail_throughput --recipients 20000 --batch-size 1000
+    python -m benchmarks.mail_throughput --serve --port 8025
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mail import BatchMailer, MAX_PERSONALIZATIONS
+
+
+class MockSendGridHandler(BaseHTTPRequestHandler):
+    """
+    Accepts POST /v3/mail/send and counts the requests and recipients received
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        personalizations = body.get("personalizations", [])
+        if self.path != "/v3/mail/send" or not 0 < len(personalizations) <= MAX_PERSONALIZATIONS:
+            self.send_response(400)
+        else:
+            with self.server.lock:
+                self.server.requests += 1
+                self.server.recipients += sum(len(p["to"]) for p in personalizations)
+            self.send_response(202)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockSendGridServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server standing in for api.sendgrid.com
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), MockSendGridHandler)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.recipients = 0
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d/v3/mail/send" % self.server_port
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure batched mail throughput against a mock SendGrid")
+    parser.add_argument("--recipients", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=MAX_PERSONALIZATIONS)
+    parser.add_argument("--serve", action="store_true", help="only run the mock server")
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = MockSendGridServer(args.port)
+    if args.serve:
+        print("mock SendGrid listening on %s" % server.url)
+        server.serve_forever()
+        return
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    mailer = BatchMailer(api_key="test", api_url=server.url, batch_size=args.batch_size)
+    recipients = ["user%d@example.com" % i for i in range(args.recipients)]
+    started = time.perf_counter()
+    mailer.send(recipients, subject="Benchmark", html="<p>benchmark</p>")
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    print("%d recipients in %d requests: %.2fs (%.0f recipients/s)" % (
+        server.recipients, server.requests, elapsed, server.recipients / elapsed
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Read model benchmark
+
+Compares peak memory and time of listing events through full ORM hydration
+(Event.query.all()) against the Core/namedtuple path in read_models, on a
+temporary database.
+
+Usage (from src/):
+    python -m benchmarks.read_models --rows 100000
+"""
+
+import argparse
+import datetime
+import os
+import tempfile
+import time
+import tracemalloc
+
+import app
+import read_models
+from db import db
+from db import Event
+
+
+def populate(rows):
+    """
+    Inserts rows synthetic events with a single executemany
+    """
+    start = datetime.datetime(2023, 1, 1, 10)
+    db.session.execute(Event.__table__.insert(), [
+        {
+            "title": "Event %d" % i,
+            "address": "Room %d" % (i % 50),
+            "start": start + datetime.timedelta(hours=i),
+            "end": start + datetime.timedelta(hours=i + 1),
+            "description": "Description of event %d" % i,
+            "host": "Host %d" % (i % 200),
+            "host_email": "host%d@example.com" % (i % 200),
+            "free": i % 2 == 0,
+            "category": None
+        }
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def measure(label, load, rows):
+    """
+    Runs load() and prints its peak traced memory and wall time
+    """
+    db.session.expunge_all()
+    tracemalloc.start()
+    started = time.perf_counter()
+    serialized = [item.serialize() for item in load()]
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_100k = peak * 100000 / rows / (1024 * 1024)
+    print("%-6s %d rows: peak %7.1f MiB (%6.1f MiB per 100k rows), %.2fs" % (
+        label, len(serialized), peak / (1024 * 1024), per_100k, elapsed
+    ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare ORM and read-model listing memory")
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        flask_app = app.create_app({
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///%s" % os.path.join(tmp, "bench.db"),
+            "SQLALCHEMY_ECHO": False
+        })
+        with flask_app.app_context():
+            db.create_all()
+            populate(args.rows)
+            measure("orm", lambda: Event.query.all(), args.rows)
+            measure("core", read_models.events, args.rows)
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
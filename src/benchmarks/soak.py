@@ -0,0 +1,434 @@
+"""
+Concurrency soak benchmark
+
+Runs the real Flask app on a temporary cms.db and drives it from a growing
+number of threads, each looping over a weighted mix of create_event,
+delete_event, /login/, /session/ and listing reads. For every concurrency
+level it prints throughput, error rates ("database is locked" counted
+separately) and how long writes spent waiting on SQLite, so journal mode,
+busy timeout, pool size and group commit can be compared run against run.
+
+Lock wait is the wall time spent inside INSERT/UPDATE/DELETE statements and
+COMMITs, which is where SQLite blocks on the write lock; without contention it
+is a fraction of a millisecond per write.
+
+Usage (from src/):
+    python -m benchmarks.soak --levels 1,2,4,8,16 --duration 10
+    python -m benchmarks.soak --journal-mode wal --group-commit --json wal.json
+"""
+
+import argparse
+import collections
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy import select
+from sqlalchemy.pool import QueuePool
+
+import app
+import fanout
+import mail
+import migrations
+from benchmarks.mail_throughput import MockSendGridServer
+from db import db
+from db import Event
+from db import User
+from db import canonical_email
+
+OPERATIONS = ("create", "delete", "login", "session", "list")
+DEFAULT_MIX = "create=3,delete=2,login=1,session=2,list=12"
+PASSWORD = "soak-password"
+WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def parse_mix(text):
+    """
+    Parses "create=3,list=10" into {operation: weight}
+    """
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError("Unknown operation: %s" % name)
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def percentile(values, fraction):
+    """
+    Returns the value at fraction (0-1) of the sorted values, or 0.0
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Recorder:
+    """
+    Collects per-operation latencies and outcomes and per-write lock waits
+    """
+
+    def __init__(self):
+        """
+        Initializes a Recorder object
+        """
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """
+        Drops everything recorded so far
+        """
+        with self._lock:
+            self.latencies = collections.defaultdict(list)
+            self.outcomes = collections.defaultdict(collections.Counter)
+            self.lock_waits = []
+            self.messages = collections.Counter()
+
+    def operation(self, name, elapsed, outcome, message=None):
+        """
+        Records one operation and its outcome ("ok", "rejected", "locked" or
+        "error"), with the exception message of failed ones
+        """
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            self.outcomes[name][outcome] += 1
+            if message:
+                self.messages[message] += 1
+
+    def write(self, elapsed):
+        """
+        Records the time spent in one write statement or commit
+        """
+        with self._lock:
+            self.lock_waits.append(elapsed)
+
+    def instrument(self, engine):
+        """
+        Times the write statements and commits of engine
+        """
+        @event.listens_for(engine, "before_cursor_execute")
+        def before(conn, cursor, statement, parameters, context, executemany):
+            self._local.started = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(WRITE_VERBS):
+                self.write(time.perf_counter() - self._local.started)
+
+        do_commit = engine.dialect.do_commit
+
+        def timed_commit(dbapi_connection):
+            started = time.perf_counter()
+            try:
+                do_commit(dbapi_connection)
+            finally:
+                self.write(time.perf_counter() - started)
+
+        engine.dialect.do_commit = timed_commit
+
+
+class Workload:
+    """
+    Shared state of the soak run: the app, seeded users and deletable events
+    """
+
+    def __init__(self, flask_app, recorder, mix, users):
+        """
+        Initializes a Workload object
+        """
+        self.app = flask_app
+        self.recorder = recorder
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.users = users
+        self.event_ids = collections.deque()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def next_address(self):
+        """
+        Returns an address no other created event uses, so create_event never
+        hits a scheduling conflict
+        """
+        with self._lock:
+            self._created += 1
+            return "Soak Hall room %d" % self._created
+
+    def run_thread(self, index, deadline):
+        """
+        Loops over random operations as user index until deadline
+        """
+        client = self.app.test_client()
+        user = self.users[index]
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            name = rng.choices(self.operations, self.weights)[0]
+            started = time.perf_counter()
+            message = None
+            try:
+                outcome = getattr(self, "do_" + name)(client, user, rng)
+            except Exception as e:
+                outcome = "locked" if "database is locked" in str(e) else "error"
+                message = "%s: %s" % (type(e).__name__, str(e).splitlines()[0][:120])
+            self.recorder.operation(name, time.perf_counter() - started, outcome, message)
+
+    def do_create(self, client, user, rng):
+        start = datetime.datetime(2030, 1, 1, 9) + datetime.timedelta(hours=rng.randrange(24 * 365))
+        response = client.post("/api/events/", data=json.dumps({
+            "title": "Soak event",
+            "address": self.next_address(),
+            "start": start.strftime("%Y-%m-%d %H:%M:%S"),
+            "end": (start + datetime.timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S"),
+            "description": "Created by the soak benchmark",
+            "host": "Soak Host %d" % rng.randrange(20),
+            "host_email": user["email"],
+            "free": rng.random() < 0.5,
+            "category": "soak"
+        }))
+        if response.status_code == 201:
+            self.event_ids.append(json.loads(response.get_data())["id"])
+        return outcome_of(response)
+
+    def do_delete(self, client, user, rng):
+        try:
+            event_id = self.event_ids.popleft()
+        except IndexError:
+            return "rejected"
+        return outcome_of(client.delete("/api/events/%d/" % event_id))
+
+    def do_login(self, client, user, rng):
+        response = client.post("/login/", data=json.dumps({"email": user["email"], "password": PASSWORD}))
+        return outcome_of(response)
+
+    def do_session(self, client, user, rng):
+        response = client.post("/session/", headers={"Authorization": "Bearer " + user["update_token"]})
+        if response.status_code == 200:
+            user["update_token"] = json.loads(response.get_data())["update_token"]
+        return outcome_of(response)
+
+    def do_list(self, client, user, rng):
+        path = rng.choice([
+            "/api/events/",
+            "/api/events/category/soak/",
+            "/api/events/host/soak-host-%d/" % rng.randrange(20),
+            "/api/events/query/?category=soak&free=true",
+        ])
+        return outcome_of(client.get(path))
+
+
+def outcome_of(response):
+    """
+    Classifies a test client response
+    """
+    if response.status_code < 400:
+        return "ok"
+    if response.status_code < 500:
+        return "rejected"
+    return "error"
+
+
+def configure_connections(engine, journal_mode, busy_timeout):
+    """
+    Sets the journal mode and busy timeout on every new connection of engine.
+    Only WAL is stored in the database file; the other journal modes and the
+    busy timeout apply to the connection that sets them
+    """
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA busy_timeout = %d" % int(busy_timeout * 1000))
+        cursor.execute("PRAGMA journal_mode = %s" % journal_mode)
+        cursor.close()
+
+    # connections opened before the listener was added do not have the pragmas
+    engine.dispose()
+
+
+def seed(users, events, bcrypt_rounds):
+    """
+    Creates the soak category, one user per thread and events to delete.
+    Returns the users as dicts with their email and update token
+    """
+    import bcrypt
+    digest = bcrypt.hashpw(PASSWORD.encode("utf8"), bcrypt.gensalt(bcrypt_rounds))
+    expiration = datetime.datetime.now() + datetime.timedelta(days=1)
+    rows = []
+    for i in range(users):
+        email = "soak%d@example.com" % i
+        rows.append({
+            "email": email,
+            "email_key": canonical_email(email),
+            "password_digest": digest,
+            "name": "Soak user %d" % i,
+            "netid": "soak%d" % i,
+            "session_token": hashlib.sha1(os.urandom(64)).hexdigest(),
+            "session_expiration": expiration,
+            "update_token": hashlib.sha1(os.urandom(64)).hexdigest()
+        })
+    db.session.execute(User.__table__.insert(), rows)
+    db.session.execute(db.text("INSERT INTO category (name) VALUES ('soak')"))
+
+    start = datetime.datetime(2029, 1, 1, 9)
+    db.session.execute(Event.__table__.insert(), [
+        {
+            "title": "Seeded event %d" % i,
+            "address": "Seed Hall room %d" % i,
+            "start": start + datetime.timedelta(hours=i),
+            "end": start + datetime.timedelta(hours=i + 1),
+            "description": "Seeded by the soak benchmark",
+            "host": "Soak Host %d" % (i % 20),
+            "host_slug": "soak-host-%d" % (i % 20),
+            "host_email": "soak@example.com",
+            "free": i % 2 == 0,
+            "category": "soak"
+        }
+        for i in range(events)
+    ])
+    db.session.commit()
+    ids = [row[0] for row in db.session.execute(select(Event.id).order_by(Event.id))]
+    return [{"email": row["email"], "update_token": row["update_token"]} for row in rows], ids
+
+
+def run_level(workload, threads, duration):
+    """
+    Runs threads workers for duration seconds and returns the level's summary
+    """
+    recorder = workload.recorder
+    recorder.reset()
+    deadline = time.perf_counter() + duration
+    workers = [
+        threading.Thread(target=workload.run_thread, args=(i, deadline), daemon=True)
+        for i in range(threads)
+    ]
+    started = time.perf_counter()
+    # the app prints (SQL echo is off, but mail and fan-out status lines are not)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    elapsed = time.perf_counter() - started
+
+    operations = {}
+    total = collections.Counter()
+    for name, latencies in recorder.latencies.items():
+        outcomes = recorder.outcomes[name]
+        total.update(outcomes)
+        operations[name] = {
+            "count": len(latencies),
+            "outcomes": dict(outcomes),
+            "p50_ms": percentile(latencies, 0.5) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000
+        }
+    count = sum(total.values())
+    waits = recorder.lock_waits
+    return {
+        "threads": threads,
+        "seconds": elapsed,
+        "operations": count,
+        "throughput": count / elapsed,
+        "error_rate": (total["error"] + total["locked"]) / count if count else 0.0,
+        "locked": total["locked"],
+        "errors": total["error"],
+        "writes": len(waits),
+        "lock_wait_total_s": sum(waits),
+        "lock_wait_p50_ms": percentile(waits, 0.5) * 1000,
+        "lock_wait_p99_ms": percentile(waits, 0.99) * 1000,
+        "lock_wait_max_ms": max(waits, default=0.0) * 1000,
+        "by_operation": operations,
+        "error_messages": dict(recorder.messages.most_common(10))
+    }
+
+
+def print_level(result):
+    print("%7d %9.1f %8.2f%% %7d %7d %9.2f %9.2f %9.2f %9.2f" % (
+        result["threads"], result["throughput"], result["error_rate"] * 100, result["locked"],
+        result["errors"], result["lock_wait_p50_ms"], result["lock_wait_p99_ms"],
+        result["lock_wait_max_ms"], result["lock_wait_total_s"]
+    ))
+    for message, count in list(result["error_messages"].items())[:3]:
+        print("        %6dx %s" % (count, message))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak the app with concurrent readers and writers")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="comma separated thread counts")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weights of %s" % ", ".join(OPERATIONS))
+    parser.add_argument("--events", type=int, default=2000, help="events seeded before the run")
+    parser.add_argument("--journal-mode", default="delete", choices=["delete", "truncate", "persist", "wal"])
+    parser.add_argument("--busy-timeout", type=float, default=5, help="SQLite busy timeout in seconds")
+    parser.add_argument("--pool-size", type=int, default=None, help="use a QueuePool of this size")
+    parser.add_argument("--group-commit", action="store_true")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4,
+                        help="cost of the seeded password hashes (the app uses 13)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.levels.split(",")]
+    mix = parse_mix(args.mix)
+
+    mail_server = MockSendGridServer()
+    threading.Thread(target=mail_server.serve_forever, daemon=True).start()
+    mail.mailer.api_url = mail_server.url
+
+    engine_options = {"connect_args": {"check_same_thread": False}}
+    if args.pool_size:
+        engine_options.update(poolclass=QueuePool, pool_size=args.pool_size, max_overflow=0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        flask_app = app.create_app({
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///%s" % os.path.join(tmp, "cms.db"),
+            "SQLALCHEMY_ECHO": False,
+            "SQLALCHEMY_ENGINE_OPTIONS": engine_options,
+            "GROUP_COMMIT": args.group_commit,
+            # let OperationalError reach the worker instead of becoming a 500
+            "PROPAGATE_EXCEPTIONS": True,
+            "CHANGELOG_COMPACT_INTERVAL": 0
+        })
+        recorder = Recorder()
+        with flask_app.app_context():
+            configure_connections(db.engine, args.journal_mode, args.busy_timeout)
+            migrations.upgrade()
+            users, event_ids = seed(max(levels), args.events, args.bcrypt_rounds)
+            recorder.instrument(db.engine)
+
+        workload = Workload(flask_app, recorder, mix, users)
+        workload.event_ids.extend(event_ids)
+
+        print("journal_mode=%s busy_timeout=%ss pool_size=%s group_commit=%s mix=%s" % (
+            args.journal_mode, args.busy_timeout, args.pool_size or "default", args.group_commit, args.mix
+        ))
+        print("threads   ops/s    errors  locked  other  wait p50  wait p99  wait max  wait sum")
+        print("                                              (ms)      (ms)      (ms)       (s)")
+        results = []
+        for threads in levels:
+            result = run_level(workload, threads, args.duration)
+            results.append(result)
+            print_level(result)
+
+        fanout.engine.join()
+        with flask_app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    mail_server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "levels": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
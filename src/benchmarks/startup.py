@@ -0,0 +1,60 @@
+"""
+Startup benchmark
+
+Measures, in fresh interpreter processes, how long it takes to import the app,
+build it with create_app() and serve the first request.
+
+Usage (from src/):
+    python -m benchmarks.startup --runs 20
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# timed inside the child so interpreter start-up itself is not counted
+CHILD = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app({"SQLALCHEMY_ECHO": False})
+created = time.perf_counter()
+flask_app.test_client().get("/")
+served = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "create_app": created - imported,
+    "first_request": served - created,
+    "total": served - started,
+}))
+"""
+
+
+def run_once():
+    """
+    Returns the timings of one cold start, in seconds
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import-to-first-request latency")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.runs)]
+    for phase in ["import", "create_app", "first_request", "total"]:
+        values = [run[phase] * 1000 for run in runs]
+        print("%-14s median %7.1f ms   min %7.1f ms   max %7.1f ms" % (
+            phase, statistics.median(values), min(values), max(values)
+        ))
+
+
+if __name__ == "__main__":
+    main()
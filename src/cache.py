@@ -0,0 +1,312 @@
+"""
+Cache helper file
+
+Small in-process caches shared by the routes in app.py, and a SQLite-backed
+cache shared by every worker process on a host
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+POLICIES = ("lru", "fifo")
+
+
+class BoundedCache:
+    """
+    Bounded, thread-safe cache with hit/miss counters
+
+    The eviction policy is either "lru" (evict the least recently used entry)
+    or "fifo" (evict the oldest inserted entry). Keys are versioned like in
+    SharedCache, so set() with a stale version() token is dropped
+    """
+
+    def __init__(self, max_size=128, policy="lru"):
+        """
+        Initializes a BoundedCache object holding at most max_size entries
+        """
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # bumped by clear(); _versions counts the deletes of each key since
+        self._generation = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.configure(max_size, policy)
+
+    def configure(self, max_size, policy="lru"):
+        """
+        Changes the size and eviction policy of the cache, dropping its entries
+        """
+        if policy not in POLICIES:
+            raise ValueError("Unknown eviction policy: %s" % policy)
+        with self._lock:
+            self.max_size = max_size
+            self.policy = policy
+            self._entries.clear()
+            self._generation += 1
+            self._versions.clear()
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key, or default if there is none
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            if self.policy == "lru":
+                self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def version(self, key):
+        """
+        Returns the current version of key, to be passed to set() once the
+        value has been loaded
+        """
+        with self._lock:
+            return self._generation, self._versions.get(key, 0)
+
+    def set(self, key, value, version=None):
+        """
+        Caches value under key, evicting an entry if the cache is full. If
+        version is given and key was deleted or the cache cleared since it
+        was taken, the value is dropped
+        """
+        with self._lock:
+            if version is not None and version != (self._generation, self._versions.get(key, 0)):
+                return
+            if key in self._entries and self.policy == "fifo":
+                self._entries[key] = value
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Removes key from the cache if it is present
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._versions) >= 4 * self.max_size:
+                # forget the counters by starting a new generation, which
+                # also invalidates every version handed out so far
+                self._generation += 1
+                self._versions.clear()
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def clear(self):
+        """
+        Removes every entry from the cache
+        """
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._versions.clear()
+
+    def stats(self):
+        """
+        Returns the size, policy and hit/miss counters of the cache
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "policy": self.policy,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+class SharedCache:
+    """
+    Cache stored in a SQLite file that all worker processes open, so an
+    entry is held once per host instead of once per worker and a delete or
+    clear in one worker is seen by all of them on their next read
+
+    Keys are versioned: delete() bumps the version of a key instead of just
+    removing it, and clear() bumps the generation of the whole cache. set()
+    with the token version() returned before the value was loaded is dropped
+    if the key was deleted or the cache cleared in the meantime, so a slow
+    reader can not put back a value that a concurrent write made stale.
+    Entries are evicted in write order ("fifo") once there are more than
+    max_size. Values must be JSON-serializable
+    """
+
+    # eviction is checked every this many sets (per process)
+    EVICT_EVERY = 64
+
+    def __init__(self, path, max_size=1024, policy="fifo", namespace="entity"):
+        """
+        Initializes a SharedCache object storing its entries in the table
+        cache_<namespace> of the SQLite file at path
+        """
+        self.path = path
+        self.namespace = namespace
+        self.table = "cache_%s" % namespace
+        self.hits = 0
+        self.misses = 0
+        self._sets = 0
+        self._local = threading.local()
+        self.configure(max_size, policy)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_generation (namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+        )
+        conn.execute("INSERT OR IGNORE INTO cache_generation VALUES (?, 0)", (namespace,))
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(%s)" % self.table)]
+        if columns and "generation" not in columns:
+            # written by a version without generations; it only holds cached data
+            conn.execute("DROP TABLE %s" % self.table)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS %s (generation INTEGER NOT NULL, key TEXT NOT NULL, "
+            "version INTEGER NOT NULL, value TEXT, stamp REAL NOT NULL, PRIMARY KEY (generation, key))" % self.table
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_%s_stamp ON %s (stamp)" % (self.table, self.table))
+        # the current generation, as a subquery of the statements below
+        self._generation = "(SELECT generation FROM cache_generation WHERE namespace = '%s')" % namespace
+
+    def configure(self, max_size, policy="fifo"):
+        """
+        Changes the size of the cache. Only the "fifo" policy is supported,
+        since tracking recency would turn every hit into a shared write
+        """
+        if policy != "fifo":
+            raise ValueError("SharedCache only supports the fifo eviction policy")
+        self.max_size = max_size
+        self.policy = policy
+
+    def _connect(self):
+        # one connection per thread; the file only holds cached data, so it
+        # does not need to survive a crash
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key, or default if there is none
+        """
+        row = self._connect().execute(
+            "SELECT value FROM %s WHERE generation = %s AND key = ? AND value IS NOT NULL"
+            % (self.table, self._generation),
+            (repr(key),)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(row[0])
+
+    def version(self, key):
+        """
+        Returns the current (generation, version) of key, to be passed to
+        set() after the value has been loaded
+        """
+        row = self._connect().execute(
+            "SELECT g.generation, coalesce(c.version, 0) FROM cache_generation g "
+            "LEFT JOIN %s c ON c.generation = g.generation AND c.key = ? WHERE g.namespace = ?" % self.table,
+            (repr(key), self.namespace)
+        ).fetchone()
+        return tuple(row)
+
+    def set(self, key, value, version=None):
+        """
+        Caches value under key. If version is given, the value is only stored
+        if key has not been invalidated since version() returned it
+        """
+        conn = self._connect()
+        data = json.dumps(value, default=str)
+        if version is None:
+            conn.execute(
+                "INSERT INTO %s (generation, key, version, value, stamp) VALUES (%s, ?, 0, ?, ?) "
+                "ON CONFLICT(generation, key) DO UPDATE SET value = excluded.value, stamp = excluded.stamp"
+                % (self.table, self._generation),
+                (repr(key), data, time.time())
+            )
+        else:
+            # written under the generation it was read in: if the cache has
+            # been cleared since, the entry is unreachable and dropped by clear
+            generation, key_version = version
+            conn.execute(
+                "INSERT INTO %s (generation, key, version, value, stamp) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(generation, key) DO UPDATE SET value = excluded.value, stamp = excluded.stamp "
+                "WHERE version = excluded.version" % self.table,
+                (generation, repr(key), key_version, data, time.time())
+            )
+        self._sets += 1
+        if self._sets % self.EVICT_EVERY == 0:
+            self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute(
+            "DELETE FROM {0} WHERE rowid IN (SELECT rowid FROM {0} ORDER BY stamp "
+            "LIMIT max((SELECT count(*) FROM {0}) - ?, 0))".format(self.table),
+            (self.max_size,)
+        )
+
+    def delete(self, key):
+        """
+        Invalidates key in every worker by bumping its version
+        """
+        self._connect().execute(
+            "INSERT INTO %s (generation, key, version, value, stamp) VALUES (%s, ?, 1, NULL, ?) "
+            "ON CONFLICT(generation, key) DO UPDATE SET version = version + 1, value = NULL, "
+            "stamp = excluded.stamp" % (self.table, self._generation),
+            (repr(key), time.time())
+        )
+
+    def clear(self):
+        """
+        Invalidates every entry in every worker by starting a new generation,
+        and drops the entries of older ones
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE cache_generation SET generation = generation + 1 WHERE namespace = ?", (self.namespace,))
+            conn.execute("DELETE FROM %s WHERE generation < %s" % (self.table, self._generation))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self):
+        """
+        Returns the shared size and policy, and this worker's hit/miss counters
+        """
+        return {
+            "size": len(self),
+            "max_size": self.max_size,
+            "policy": self.policy,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": True
+        }
+
+    def __len__(self):
+        return self._connect().execute(
+            "SELECT count(*) FROM %s WHERE generation = %s AND value IS NOT NULL" % (self.table, self._generation)
+        ).fetchone()[0]
+
+    def __contains__(self, key):
+        return self._connect().execute(
+            "SELECT 1 FROM %s WHERE generation = %s AND key = ? AND value IS NOT NULL" % (self.table, self._generation),
+            (repr(key),)
+        ).fetchone() is not None
@@ -0,0 +1,127 @@
+"""
+Change log helper file
+
+Every write endpoint appends a compact record (entity, id, op, serialized row)
+to the sequence-numbered change_log table in the same transaction as the
+write itself, so a committed change always has its entry and a rolled back
+one never does. Sync jobs (search indexer, analytics) read the log
+incrementally through /api/changes/?since=<seq> instead of re-downloading and
+diffing /api/events/.
+
+Compaction drops entries that a later entry for the same row supersedes, in
+small batches so it never holds the write lock for long. A consumer that
+resumes from an older seq after compaction still converges to the current
+state, it just skips the intermediate versions. Deletes stay in the log as
+tombstones.
+"""
+
+import json
+import threading
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from db import db
+from db import Change
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+def record(entity, entity_id, op=UPSERT, data=None):
+    """
+    Adds a change of the row entity_id of table entity to the current
+    transaction, without committing. data is the serialized row (ignored for
+    deletes)
+    """
+    if op == DELETE:
+        data = None
+    db.session.add(Change(
+        entity = entity,
+        entity_id = entity_id,
+        op = op,
+        data = json.dumps(data, default=str) if data is not None else None
+    ))
+    compactor.start()
+
+
+def since(seq, limit=100):
+    """
+    Returns up to limit changes with a sequence number above seq, oldest
+    first
+    """
+    return db.session.execute(
+        select(Change).where(Change.seq > seq).order_by(Change.seq).limit(limit)
+    ).scalars().all()
+
+
+class Compactor:
+    """
+    Periodically removes superseded change log entries
+    """
+
+    def __init__(self, interval=3600, batch_size=1000):
+        """
+        Initializes a Compactor object
+        """
+        self.app = None
+        self.interval = interval
+        self.batch_size = batch_size
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Binds the compactor to a Flask app and reads CHANGELOG_* settings.
+        A CHANGELOG_COMPACT_INTERVAL of 0 disables periodic compaction
+        """
+        self.app = app
+        self.interval = app.config.get("CHANGELOG_COMPACT_INTERVAL", self.interval)
+        self.batch_size = app.config.get("CHANGELOG_COMPACT_BATCH", self.batch_size)
+
+    def start(self):
+        """
+        Starts the compaction thread if it is not running yet
+        """
+        if self._thread is not None or not self.interval:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="changelog-compactor", daemon=True)
+                self._thread.start()
+
+    def compact(self):
+        """
+        Deletes every entry that has a later entry for the same row, one
+        batch per transaction. Must be called inside an app context. Returns
+        the number of entries removed
+        """
+        later = aliased(Change)
+        superseded = (
+            select(Change.seq)
+            .where(
+                select(later.seq)
+                .where(later.entity == Change.entity, later.entity_id == Change.entity_id, later.seq > Change.seq)
+                .exists()
+            )
+            .order_by(Change.seq)
+            .limit(self.batch_size)
+        )
+        removed = 0
+        while True:
+            seqs = db.session.execute(superseded).scalars().all()
+            if not seqs:
+                return removed
+            db.session.execute(Change.__table__.delete().where(Change.__table__.c.seq.in_(seqs)))
+            db.session.commit()
+            removed += len(seqs)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    self.compact()
+            except Exception as e:
+                print("change log compaction failed: %s" % e)
+
+
+compactor = Compactor()
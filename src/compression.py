@@ -0,0 +1,76 @@
+"""
+Compression helper file
+
+Helper functions for negotiating gzip/brotli compression of large JSON
+responses. Compressed bodies are cached by ETag so repeated reads of an
+unchanged payload are not compressed again.
+"""
+
+import gzip
+import hashlib
+import json
+from flask import current_app, request
+from cache import BoundedCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# responses smaller than this (in bytes) are sent uncompressed
+MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+compressed_bodies = BoundedCache(max_size=64)
+
+
+def make_etag(body):
+    """
+    Returns a strong (unquoted) ETag for a response body
+    """
+    return hashlib.sha1(body).hexdigest()
+
+
+def choose_encoding():
+    """
+    Returns the best encoding the client accepts ("br" or "gzip"), or None
+    """
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(supported)
+
+
+def compress(body, encoding):
+    """
+    Compresses body with the given encoding
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compressed_response(data, code=200):
+    """
+    Helper function for outputting success data, compressed when the client
+    accepts it and the body is larger than the size threshold
+    """
+    body = json.dumps(data, default=str).encode("utf8")
+    etag = make_etag(body)
+    headers = {"ETag": '"%s"' % etag, "Vary": "Accept-Encoding"}
+
+    if request.if_none_match.contains(etag):
+        return "", 304, headers
+
+    min_size = current_app.config.get("COMPRESS_MIN_SIZE", MIN_SIZE)
+    encoding = choose_encoding()
+    if len(body) < min_size or encoding is None:
+        return body, code, headers
+
+    key = (etag, encoding)
+    compressed = compressed_bodies.get(key)
+    if compressed is None:
+        compressed = compress(body, encoding)
+        compressed_bodies.set(key, compressed)
+
+    headers["Content-Encoding"] = encoding
+    return compressed, code, headers
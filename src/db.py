@@ -1,13 +1,32 @@
 from flask_sqlalchemy import SQLAlchemy
 import datetime
 import hashlib
+import json
 import os
-import bcrypt
+import re
+from sqlalchemy.orm import validates
 
 db = SQLAlchemy()
 
+
+def slugify(text):
+  """
+  Returns the lookup key of a host name: lower-cased words joined by "-"
+  ("Cornell  Data Club" and "cornell-data-club" both become "cornell-data-club")
+  """
+  return "-".join(re.findall(r"[^\W_]+", text.lower()))
+
+
+def canonical_email(email):
+  """
+  Returns the lookup key of an email address: trimmed and lower-cased
+  """
+  return email.strip().lower()
+
+
 class MyDateTime(db.TypeDecorator):
     impl = db.DateTime
+    cache_ok = True
     
     def process_bind_param(self, value, dialect):
         if type(value) is str:
@@ -20,6 +39,14 @@ class Event(db.Model):
   Event model
   """
   __tablename__ = "event"
+  __table_args__ = (
+    db.Index("ix_event_category_start", "category", "start"),
+    db.Index("ix_event_host_slug", "host_slug", "id", unique=True),
+    db.Index("ix_event_start", "start"),
+    db.Index("ix_event_fingerprint", "fingerprint", unique=True),
+    # recurring series by end and start, for expanding the series in a window
+    db.Index("ix_event_series", "recurrence_end", "start", sqlite_where=db.text("recurrence IS NOT NULL")),
+  )
   id = db.Column(db.Integer, primary_key = True, autoincrement = True)
   title = db.Column(db.String, nullable=False)
   address = db.Column(db.String, nullable=False)
@@ -27,9 +54,23 @@ class Event(db.Model):
   end = db.Column(MyDateTime, nullable=False)
   description = db.Column(db.String, nullable=False)
   host = db.Column(db.String, nullable=False)
+  host_slug = db.Column(db.String, nullable=True)
   host_email = db.Column(db.String, nullable=False)
   free = db.Column(db.Boolean, nullable=False)
   category = db.Column(db.String, db.ForeignKey("category.name"), nullable=True)
+  # RRULE-style rule (see recurrence.py) and the start of the last occurrence
+  recurrence = db.Column(db.String, nullable=True)
+  recurrence_end = db.Column(MyDateTime, nullable=True)
+  # content hash of title, address, start, end and host (see dedupe.py)
+  fingerprint = db.Column(db.String, nullable=True)
+
+  @validates("host")
+  def validate_host(self, key, host):
+    """
+    Keeps host_slug in sync with host
+    """
+    self.host_slug = slugify(host) if host is not None else None
+    return host
 
   def ___init___(self, **kwargs):
     """
@@ -59,7 +100,8 @@ class Event(db.Model):
       "host": self.host,
       "host_email": self.host_email,
       "free": self.free,
-      "category": self.category
+      "category": self.category,
+      "recurrence": self.recurrence
     }
 
 
@@ -70,8 +112,12 @@ class User(db.Model):
   """
 
   __tablename__ = "user"
+  __table_args__ = (
+    db.Index("ix_user_email_key", "email_key", unique=True),
+  )
   id = db.Column(db.Integer, primary_key = True, autoincrement=True)
   email = db.Column(db.String, nullable=False, unique=True)
+  email_key = db.Column(db.String, nullable=True)
   password_digest = db.Column(db.String, nullable=False)
 
   name = db.Column(db.String, nullable=False)
@@ -89,9 +135,18 @@ class User(db.Model):
     self.name = kwargs.get("name", "")
     self.netid = kwargs.get("netid", "")
     self.email = kwargs.get("email", "")
+    import bcrypt
     self.password_digest = bcrypt.hashpw(kwargs.get("password").encode("utf8"), bcrypt.gensalt(13))
     self.renew_session()
 
+  @validates("email")
+  def validate_email(self, key, email):
+    """
+    Keeps email_key in sync with email
+    """
+    self.email_key = canonical_email(email) if email is not None else None
+    return email
+
   def serialize(self):
     """
     Serializes a User object
@@ -124,6 +179,7 @@ class User(db.Model):
       """
       Verifies the password of a user
       """
+      import bcrypt
       return bcrypt.checkpw(password.encode("utf8"), self.password_digest)
 
   def verify_session_token(self, session_token):
@@ -171,4 +227,102 @@ class Category(db.Model):
     return{
       "id": self.id, 
       "name": self.name,
-    }
\ No newline at end of file
+    }
+
+class Subscription(db.Model):
+  """
+  Subscription model: a User following a Category
+  """
+  __tablename__ = "subscription"
+  __table_args__ = (
+    # subscribers of a category are looked up (and paged by user_id) through this index
+    db.Index("ix_subscription_category_user", "category_id", "user_id", unique=True),
+  )
+  id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+  user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+  category_id = db.Column(db.Integer, db.ForeignKey("category.id", ondelete="CASCADE"), nullable=False)
+
+  def __init__(self, **kwargs):
+    """
+    Initializes a Subscription object
+    """
+    self.user_id = kwargs.get("user_id")
+    self.category_id = kwargs.get("category_id")
+
+  def serialize(self):
+    """
+    Serializes a Subscription object
+    """
+    return {
+      "id": self.id,
+      "user_id": self.user_id,
+      "category_id": self.category_id
+    }
+
+
+class EventStats(db.Model):
+  """
+  EventStats model: aggregated view/click counts of an Event
+  """
+  __tablename__ = "event_stats"
+  __table_args__ = (
+    db.Index("ix_event_stats_views", "views"),
+  )
+  event_id = db.Column(db.Integer, db.ForeignKey("event.id", ondelete="CASCADE"), primary_key=True)
+  views = db.Column(db.Integer, nullable=False, default=0)
+  clicks = db.Column(db.Integer, nullable=False, default=0)
+
+  def serialize(self):
+    """
+    Serializes an EventStats object
+    """
+    return {
+      "event_id": self.event_id,
+      "views": self.views,
+      "clicks": self.clicks
+    }
+
+
+class DailyEventCount(db.Model):
+  """
+  DailyEventCount model: number of (non-recurring) Events starting on a day,
+  per category ("" for events without one). Maintained on every event write
+  """
+  __tablename__ = "daily_event_count"
+  day = db.Column(db.Date, primary_key=True)
+  category = db.Column(db.String, primary_key=True, default="")
+  count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Change(db.Model):
+  """
+  Change model: one entry of the append-only change log, read by sync jobs
+  through /api/changes/. data is the serialized row after the change (null
+  for deletes)
+  """
+  __tablename__ = "change_log"
+  __table_args__ = (
+    # compaction looks for later changes of the same row through this index
+    db.Index("ix_change_log_entity", "entity", "entity_id", "seq"),
+    # never reuse the seq of a compacted entry
+    {"sqlite_autoincrement": True},
+  )
+  seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+  entity = db.Column(db.String, nullable=False)
+  entity_id = db.Column(db.Integer, nullable=False)
+  op = db.Column(db.String, nullable=False)
+  data = db.Column(db.Text, nullable=True)
+  created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+
+  def serialize(self):
+    """
+    Serializes a Change object
+    """
+    return {
+      "seq": self.seq,
+      "entity": self.entity,
+      "entity_id": self.entity_id,
+      "op": self.op,
+      "data": json.loads(self.data) if self.data is not None else None,
+      "created_at": self.created_at
+    }
@@ -0,0 +1,142 @@
+"""
+Event deduplication helper file
+
+Every event gets a content fingerprint: a hash of its normalized title,
+address, start, end and host, so a repost of the same event (different case,
+spacing or punctuation) has the same fingerprint. The fingerprint column has
+a unique index, which makes "is this a duplicate?" one index lookup and keeps
+duplicates out even when two reposts race.
+
+Rows written before the column existed are fingerprinted by backfill(), which
+also removes the duplicates among them.
+"""
+
+import hashlib
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert
+from db import db
+from db import Event
+from db import EventStats
+from db import slugify
+import changelog
+import intervals
+import rollups
+
+# separates the fields so ("a b", "c") and ("a", "b c") hash differently
+SEPARATOR = "\x1f"
+
+
+def fingerprint(title, address, start, end, host):
+    """
+    Returns the content fingerprint of an event. start and end are datetimes
+    or YYYY-MM-DD HH:MM:SS strings; raises ValueError on any other format
+    """
+    parts = [
+        intervals.normalize_address(title),
+        intervals.normalize_address(address),
+        intervals.parse_time(start).strftime(intervals.DATE_FORMAT),
+        intervals.parse_time(end).strftime(intervals.DATE_FORMAT),
+        slugify(host),
+    ]
+    return hashlib.sha1(SEPARATOR.join(parts).encode("utf8")).hexdigest()
+
+
+def fingerprint_of(event):
+    """
+    Returns the content fingerprint of an Event
+    """
+    return fingerprint(event.title, event.address, event.start, event.end, event.host)
+
+
+@event.listens_for(Event, "before_insert")
+def set_fingerprint(mapper, connection, target):
+    """
+    Fingerprints a new Event
+    """
+    target.fingerprint = fingerprint_of(target)
+
+
+@event.listens_for(Event, "before_update")
+def update_fingerprint(mapper, connection, target):
+    """
+    Keeps the fingerprint of an updated Event in sync with its content.
+    Events that have not been backfilled yet are left to backfill()
+    """
+    if target.fingerprint is not None:
+        target.fingerprint = fingerprint_of(target)
+
+
+def find_duplicate(value):
+    """
+    Returns the Event with the given fingerprint, or None
+    """
+    return Event.query.filter_by(fingerprint = value).first()
+
+
+def merge_stats(duplicate_id, survivor_id):
+    """
+    Adds the view/click counts of a duplicate Event to the Event kept in its
+    place, in the current transaction
+    """
+    stats = EventStats.query.filter_by(event_id = duplicate_id).first()
+    if stats is None:
+        return
+    statement = insert(EventStats.__table__).values(event_id=survivor_id, views=stats.views, clicks=stats.clicks)
+    statement = statement.on_conflict_do_update(
+        index_elements=["event_id"],
+        set_={
+            "views": EventStats.__table__.c.views + statement.excluded.views,
+            "clicks": EventStats.__table__.c.clicks + statement.excluded.clicks
+        }
+    )
+    db.session.execute(statement)
+    db.session.delete(stats)
+
+
+def remove_duplicate(duplicate, survivor_id):
+    """
+    Deletes a duplicate Event and its derived rows, in the current
+    transaction
+    """
+    merge_stats(duplicate.id, survivor_id)
+    intervals.unindex_event(duplicate.id)
+    rollups.event_removed(duplicate)
+    changelog.record(Event.__tablename__, duplicate.id, changelog.DELETE)
+    db.session.delete(duplicate)
+
+
+def backfill(batch_size=500):
+    """
+    Fingerprints the events that have no fingerprint yet, oldest first, and
+    deletes the ones that duplicate an event already seen. Each batch is its
+    own short transaction so the server keeps writing in between. Must be
+    called inside an app context. Returns (fingerprinted, removed)
+    """
+    fingerprinted = removed = 0
+    after = 0
+    while True:
+        batch = (
+            Event.query
+            .filter(Event.fingerprint.is_(None), Event.id > after)
+            .order_by(Event.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            return fingerprinted, removed
+        after = batch[-1].id
+
+        values = {row.id: fingerprint_of(row) for row in batch}
+        survivors = dict(db.session.execute(
+            select(Event.fingerprint, Event.id).where(Event.fingerprint.in_(set(values.values())))
+        ).all())
+        for row in batch:
+            value = values[row.id]
+            if value in survivors:
+                remove_duplicate(row, survivors[value])
+                removed += 1
+            else:
+                survivors[value] = row.id
+                row.fingerprint = value
+                fingerprinted += 1
+        db.session.commit()
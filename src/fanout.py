@@ -0,0 +1,151 @@
+"""
+Fan-out notification engine
+
+Notifies the subscribers of a Category when an event is posted to it.
+Notifications are queued from the request and delivered by a background
+worker, which pages through subscribers with the (category_id, user_id) index
+in chunks of at most one mail batch, so a category's subscribers are never all
+in memory at once.
+"""
+
+import html
+import queue
+import threading
+import time
+from sqlalchemy import select
+from db import db
+from db import Category
+from db import Subscription
+from db import User
+import mail
+
+
+def iter_subscriber_chunks(category_name, chunk_size):
+    """
+    Yields the emails of a category's subscribers, chunk_size at a time, using
+    keyset pagination on user_id
+    """
+    category_id = db.session.execute(
+        select(Category.id).where(Category.name == category_name)
+    ).scalar()
+    if category_id is None:
+        return
+
+    last_user_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Subscription.user_id, User.email)
+            .join(User, User.id == Subscription.user_id)
+            .where(Subscription.category_id == category_id, Subscription.user_id > last_user_id)
+            .order_by(Subscription.user_id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        last_user_id = rows[-1][0]
+        yield [email for _, email in rows]
+        if len(rows) < chunk_size:
+            return
+
+
+def new_event_message(event):
+    """
+    Returns the subject and HTML body of a new event notification
+    """
+    subject = "New %s event on Eventery" % event["category"]
+    body = "<p>%s</p><p>%s &ndash; %s at %s</p><p>%s</p>" % tuple(
+        html.escape(str(event[field]))
+        for field in ["title", "start", "end", "address", "description"]
+    )
+    return subject, body
+
+
+class FanoutEngine:
+    """
+    Queues new event notifications and delivers them on a worker thread
+    """
+
+    def __init__(self, mailer=None, chunk_size=mail.MAX_PERSONALIZATIONS, max_pending=1000):
+        """
+        Initializes a FanoutEngine object
+        """
+        self.app = None
+        self.mailer = mailer or mail.mailer
+        self.chunk_size = chunk_size
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.stats = {"jobs": 0, "chunks": 0, "recipients": 0, "failed_recipients": 0, "errors": 0, "last_latency": None}
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Binds the engine to a Flask app, whose context the worker runs in
+        """
+        self.app = app
+        self.chunk_size = app.config.get("FANOUT_CHUNK_SIZE", self.chunk_size)
+
+    def notify(self, event):
+        """
+        Queues a notification for a serialized event to its category's
+        subscribers. Returns False if the queue is full
+        """
+        if not event.get("category"):
+            return True
+        self._ensure_worker()
+        try:
+            self.jobs.put_nowait((time.perf_counter(), event))
+        except queue.Full:
+            print("fan-out queue full, dropping notification for event %s" % event["id"])
+            return False
+        return True
+
+    def deliver(self, event):
+        """
+        Sends the notification for event to every subscriber of its category,
+        one chunk per mail request. A chunk that fails is counted in
+        failed_recipients and the remaining chunks are still sent. Must be
+        called inside an app context
+        """
+        subject, body = new_event_message(event)
+        for emails in iter_subscriber_chunks(event["category"], self.chunk_size):
+            failed = 0
+            try:
+                self.mailer.send(emails, subject=subject, html=body)
+            except mail.MailError as e:
+                failed = sum(len(batch) for batch, _ in e.failures)
+                print("fan-out for event %s: %d recipient(s) failed: %s" % (event.get("id"), failed, e))
+            with self._lock:
+                self.stats["chunks"] += 1
+                self.stats["recipients"] += len(emails) - failed
+                self.stats["failed_recipients"] += failed
+
+    def join(self):
+        """
+        Blocks until every queued notification has been delivered
+        """
+        self.jobs.join()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="fanout", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            queued_at, event = self.jobs.get()
+            try:
+                with self.app.app_context():
+                    self.deliver(event)
+                with self._lock:
+                    self.stats["jobs"] += 1
+                    self.stats["last_latency"] = time.perf_counter() - queued_at
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                print("fan-out for event %s failed: %s" % (event.get("id"), e))
+            finally:
+                self.jobs.task_done()
+
+
+engine = FanoutEngine()
@@ -0,0 +1,138 @@
+"""
+Group commit writer
+
+Opt-in (GROUP_COMMIT=1) single writer thread for write endpoints. Request
+threads hand their writes to the writer, which gathers the jobs that arrive
+within a few milliseconds, runs them in one transaction and commits once, so
+a burst of inserts pays for one fsync instead of one each. Each caller gets
+its own job's return value (e.g. the serialized row with its generated id).
+
+Jobs are functions that write through db.session without committing and
+return plain data; they run on the writer thread, so they must not touch the
+request or return ORM objects. If a batch fails, it is rolled back and its
+jobs are retried one transaction each, so one bad job only fails its caller.
+
+Every write transaction starts with BEGIN IMMEDIATE, taking the database write
+lock before the first job runs, so what a job reads before writing (e.g. a
+conflict check) cannot change under it until the commit.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from db import db
+
+
+class GroupCommitWriter:
+    """
+    Batches write jobs from request threads into shared transactions
+    """
+
+    def __init__(self, window=0.005, max_batch=200, timeout=30):
+        """
+        Initializes a GroupCommitWriter object. window is how long (in
+        seconds) the writer waits for more jobs after the first one arrives
+        """
+        self.app = None
+        self.enabled = False
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.jobs = queue.Queue()
+        self.stats = {"batches": 0, "jobs": 0, "retried_batches": 0}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Binds the writer to a Flask app and reads GROUP_COMMIT* settings
+        """
+        self.app = app
+        self.enabled = bool(app.config.get("GROUP_COMMIT", False))
+        self.window = app.config.get("GROUP_COMMIT_WINDOW", self.window)
+        self.max_batch = app.config.get("GROUP_COMMIT_MAX_BATCH", self.max_batch)
+
+    def write(self, job):
+        """
+        Runs job and commits its writes, returning job's result. With group
+        commit off this happens directly on the caller's session
+        """
+        if not self.enabled:
+            try:
+                self._begin()
+                result = job()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            return result
+
+        future = Future()
+        self._ensure_thread()
+        self.jobs.put((job, future))
+        return future.result(timeout=self.timeout)
+
+    def _begin(self):
+        connection = db.session.connection().connection.dbapi_connection
+        if not connection.in_transaction:
+            connection.execute("BEGIN IMMEDIATE")
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self.jobs.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.jobs.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self.app.app_context():
+                self._commit(batch)
+
+    def _commit(self, batch):
+        self.stats["batches"] += 1
+        self.stats["jobs"] += len(batch)
+        try:
+            self._begin()
+            results = [job() for job, _ in batch]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            self.stats["retried_batches"] += 1
+            for job, future in batch:
+                self._commit_one(job, future)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _commit_one(self, job, future):
+        try:
+            self._begin()
+            result = job()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+
+writer = GroupCommitWriter()
@@ -0,0 +1,152 @@
+"""
+Idempotency key helper file
+
+Lets clients safely retry POST requests by sending an `Idempotency-Key`
+header. The first request with a key runs the handler and its response is kept
+for `ttl` seconds; retries with the same key get that response back without
+running the handler again. A retry that arrives while the first request is
+still running waits for it instead of running in parallel.
+"""
+
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, make_response, request
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# headers of the original response that are replayed
+KEPT_HEADERS = ("Content-Type", "Content-Encoding", "ETag", "Vary")
+
+
+class Entry:
+    """
+    State of one idempotency key: in flight until `response` is set
+    """
+
+    __slots__ = ("fingerprint", "done", "response", "expires")
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.response = None
+        self.expires = None
+
+
+class IdempotencyStore:
+    """
+    Bounded, TTL'd store of idempotency key -> (status, body, headers)
+    """
+
+    def __init__(self, ttl=24 * 60 * 60, max_size=10000, wait_timeout=30):
+        """
+        Initializes an IdempotencyStore object
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key, fingerprint):
+        """
+        Returns (entry, True) if the caller should run the request for key,
+        or (entry, False) if another request with key exists already
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires is not None and entry.expires <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                return entry, False
+
+            entry = Entry(fingerprint)
+            self._entries[key] = entry
+            self._evict()
+            return entry, True
+
+    def finish(self, key, entry, response):
+        """
+        Stores the (status, body, headers) of a finished request and wakes up
+        any waiting duplicates. A response of None forgets the key so the
+        request can be retried
+        """
+        with self._lock:
+            if response is None:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            else:
+                entry.response = response
+                entry.expires = time.monotonic() + self.ttl
+        entry.done.set()
+
+    def _evict(self):
+        # drop the oldest finished entries; in-flight requests are never dropped
+        if len(self._entries) <= self.max_size:
+            return
+        for key in list(self._entries):
+            if self._entries[key].done.is_set():
+                del self._entries[key]
+                if len(self._entries) <= self.max_size:
+                    return
+
+    def __len__(self):
+        return len(self._entries)
+
+
+store = IdempotencyStore()
+
+
+def replay(response):
+    """
+    Rebuilds a stored (status, body, headers) response for a retried request
+    """
+    status, body, headers = response
+    replayed = Response(body, status, headers)
+    replayed.headers[REPLAYED_HEADER] = "true"
+    return replayed
+
+
+def idempotent(view):
+    """
+    Decorator for POST endpoints that honors the Idempotency-Key header.
+    Requests without the header are handled as usual
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+
+        scoped_key = (request.method, request.path, key)
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        while True:
+            entry, owner = store.begin(scoped_key, fingerprint)
+            if owner:
+                break
+            if entry.fingerprint != fingerprint:
+                return json.dumps({"error": "Idempotency-Key was already used with a different body"}), 422
+            if not entry.done.wait(store.wait_timeout):
+                return json.dumps({"error": "A request with this Idempotency-Key is still in progress"}), 409
+            if entry.response is not None:
+                return replay(entry.response)
+            # the first request failed and released the key; try to take it over
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            store.finish(scoped_key, entry, None)
+            raise
+
+        if response.status_code >= 500:
+            store.finish(scoped_key, entry, None)
+        else:
+            headers = [(name, response.headers[name]) for name in KEPT_HEADERS if name in response.headers]
+            store.finish(scoped_key, entry, (response.status_code, response.get_data(), headers))
+        return response
+    return wrapper
@@ -0,0 +1,174 @@
+"""
+Scheduling interval index
+
+Keeps an SQLite R*Tree over (address, start, end) so events that overlap at
+the same address can be found in logarithmic time instead of by scanning
+every event. Each event is stored as a box [address key] x [start, end] in
+whole minutes; the address key is a 31-bit hash of the normalized address,
+and candidates are re-checked against the real address to rule out hash
+collisions.
+
+Recurring events additionally get a box in a second R*Tree spanning all of
+their occurrences, from the start of the first one to the end of the last (or
+to the end of the minute range for series that never end), so a booking is
+only expanded against the series at its own address that may reach it.
+"""
+
+import datetime
+import re
+import zlib
+from sqlalchemy import select, text
+from db import db
+from db import Event
+
+TABLE = "event_interval"
+SERIES_TABLE = "event_series_interval"
+# last minute of the box of a series that repeats forever
+UNBOUNDED = 2 ** 31 - 1
+EPOCH = datetime.datetime(1970, 1, 1)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def normalize_address(address):
+    """
+    Returns a canonical form of an address: lower-cased, punctuation dropped
+    and whitespace collapsed
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", address.lower()).split())
+
+
+def address_key(address):
+    """
+    Returns the integer R*Tree coordinate of an address
+    """
+    return zlib.crc32(normalize_address(address).encode("utf8")) & 0x7fffffff
+
+
+def parse_time(value):
+    """
+    Returns value as a datetime, parsing YYYY-MM-DD HH:MM:SS strings.
+    Raises ValueError on any other format
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.strptime(value, DATE_FORMAT)
+
+
+def to_minutes(start, end):
+    """
+    Returns the inclusive minute range covered by [start, end). Events that
+    only touch (one ends when the next starts) do not overlap
+    """
+    first = int((start - EPOCH).total_seconds() // 60)
+    last = -int(-(end - EPOCH).total_seconds() // 60) - 1
+    return first, max(first, last)
+
+
+def create_index():
+    """
+    Creates the R*Trees if needed and fills each from the event table if it
+    is empty. Must be called inside an app context
+    """
+    for table in (TABLE, SERIES_TABLE):
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING rtree_i32("
+            "id, address_min, address_max, start_min, end_max)" % table
+        ))
+    if db.session.execute(text("SELECT count(*) FROM %s" % TABLE)).scalar() == 0:
+        rows = db.session.execute(select(Event.id, Event.address, Event.start, Event.end)).all()
+        if rows:
+            db.session.execute(insert_statement(), [interval_params(*row) for row in rows])
+    if db.session.execute(text("SELECT count(*) FROM %s" % SERIES_TABLE)).scalar() == 0:
+        rows = db.session.execute(
+            select(Event.id, Event.address, Event.start, Event.end, Event.recurrence_end)
+            .where(Event.recurrence.isnot(None))
+        ).all()
+        if rows:
+            db.session.execute(insert_statement(SERIES_TABLE), [series_params(*row) for row in rows])
+    db.session.commit()
+
+
+def insert_statement(table=TABLE):
+    return text("INSERT OR REPLACE INTO %s VALUES (:id, :key, :key, :first, :last)" % table)
+
+
+def interval_params(event_id, address, start, end):
+    first, last = to_minutes(parse_time(start), parse_time(end))
+    return {"id": event_id, "key": address_key(address), "first": first, "last": last}
+
+
+def series_params(event_id, address, start, end, recurrence_end):
+    start, end = parse_time(start), parse_time(end)
+    first = to_minutes(start, end)[0]
+    if recurrence_end is None:
+        last = UNBOUNDED
+    else:
+        recurrence_end = parse_time(recurrence_end)
+        last = to_minutes(recurrence_end, recurrence_end + (end - start))[1]
+    return {"id": event_id, "key": address_key(address), "first": first, "last": last}
+
+
+def index_event(event_id, address, start, end):
+    """
+    Adds or replaces the interval of an event in the current transaction
+    """
+    db.session.execute(insert_statement(), interval_params(event_id, address, start, end))
+
+
+def unindex_event(event_id):
+    """
+    Removes the interval (and series box) of an event in the current
+    transaction
+    """
+    for table in (TABLE, SERIES_TABLE):
+        db.session.execute(text("DELETE FROM %s WHERE id = :id" % table), {"id": event_id})
+
+
+def index_series(event_id, address, start, end, recurrence_end):
+    """
+    Adds or replaces the box of a recurring event in the current
+    transaction. recurrence_end is the start of its last occurrence, or None
+    if it never ends
+    """
+    db.session.execute(
+        insert_statement(SERIES_TABLE), series_params(event_id, address, start, end, recurrence_end)
+    )
+
+
+def find_series(address, start, end):
+    """
+    Returns the ids of the recurring events whose box overlaps [start, end)
+    at the address key of address. Candidates still have to be checked
+    against the real address and their actual occurrences
+    """
+    key = address_key(address)
+    first, last = to_minutes(parse_time(start), parse_time(end))
+    return db.session.execute(
+        text(
+            "SELECT id FROM %s WHERE address_min <= :key AND address_max >= :key "
+            "AND start_min <= :last AND end_max >= :first" % SERIES_TABLE
+        ),
+        {"key": key, "first": first, "last": last}
+    ).scalars().all()
+
+
+def find_conflicts(address, start, end, exclude_id=None):
+    """
+    Returns the Events at the same (normalized) address whose time range
+    overlaps [start, end), ordered by start
+    """
+    key = address_key(address)
+    first, last = to_minutes(parse_time(start), parse_time(end))
+    ids = db.session.execute(
+        text(
+            "SELECT id FROM %s WHERE address_min <= :key AND address_max >= :key "
+            "AND start_min <= :last AND end_max >= :first" % TABLE
+        ),
+        {"key": key, "first": first, "last": last}
+    ).scalars().all()
+    ids = [event_id for event_id in ids if event_id != exclude_id]
+    if not ids:
+        return []
+    normalized = normalize_address(address)
+    events = Event.query.filter(Event.id.in_(ids)).order_by(Event.start).all()
+    return [event for event in events if normalize_address(event.address) == normalized]
@@ -0,0 +1,115 @@
+"""
+Schema migration helper file
+
+Brings an existing database up to date with the models in db.py. Run through
+`flask --app app init-db` (or `python app.py init-db`) rather than at import.
+"""
+
+from sqlalchemy import bindparam, inspect, select
+from db import db
+from db import Event
+from db import User
+from db import canonical_email
+from db import slugify
+import dedupe
+import intervals
+import rollups
+
+
+def add_missing_columns(table):
+    """
+    Adds the columns of table that are missing in the database
+
+    SQLite can only add nullable (or defaulted) columns without constraints,
+    so new unique columns should get their uniqueness from a separate Index
+    """
+    existing = {column["name"] for column in inspect(db.engine).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(
+                'ALTER TABLE "%s" ADD COLUMN "%s" %s' % (table.name, column.name, column_type)
+            )
+
+
+def backfill_lookup_keys():
+    """
+    Fills host_slug and email_key for rows written before those columns
+    existed. Users whose canonical email collides with another user's are
+    left without a key (and reported) so the unique index can still be built
+    """
+    events = db.session.execute(select(Event.id, Event.host).where(Event.host_slug.is_(None))).all()
+    if events:
+        db.session.execute(
+            Event.__table__.update().where(Event.__table__.c.id == bindparam("event_id")).values(host_slug=bindparam("slug")),
+            [{"event_id": event_id, "slug": slugify(host)} for event_id, host in events]
+        )
+
+    taken = set(db.session.execute(select(User.email_key).where(User.email_key.isnot(None))).scalars())
+    rows = []
+    for user_id, email in db.session.execute(select(User.id, User.email).where(User.email_key.is_(None)).order_by(User.id)):
+        key = canonical_email(email)
+        if key in taken:
+            print("user %s: %s collides with another user's email, not setting email_key" % (user_id, email))
+            continue
+        taken.add(key)
+        rows.append({"user_id": user_id, "key": key})
+    if rows:
+        db.session.execute(
+            User.__table__.update().where(User.__table__.c.id == bindparam("user_id")).values(email_key=bindparam("key")),
+            rows
+        )
+    db.session.commit()
+
+
+# plain index on event.fingerprint used while duplicates may still exist, so
+# each backfill batch's fingerprint lookup is not a full scan
+BACKFILL_INDEX = "ix_event_fingerprint_backfill"
+
+
+def add_missing_tables_and_columns():
+    """
+    Creates missing tables and adds missing columns to the existing ones
+    """
+    db.create_all()
+    for table in db.metadata.sorted_tables:
+        add_missing_columns(table)
+
+
+def dedupe_events():
+    """
+    Fingerprints existing events and removes duplicates without building the
+    unique fingerprint index, so it can run in small batches on a live
+    database ahead of `init-db`. Brings the schema and the derived tables up
+    to date first, since removing a duplicate updates them. Must be called
+    inside an app context. Returns (fingerprinted, removed)
+    """
+    add_missing_tables_and_columns()
+    intervals.create_index()
+    rollups.rebuild_if_empty()
+    indexes = {index["name"] for index in inspect(db.engine).get_indexes(Event.__tablename__)}
+    if "ix_event_fingerprint" not in indexes:
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(
+                'CREATE INDEX IF NOT EXISTS "%s" ON "%s" (fingerprint)' % (BACKFILL_INDEX, Event.__tablename__)
+            )
+    return dedupe.backfill()
+
+
+def upgrade():
+    """
+    Creates missing tables, then adds missing columns and indexes to the
+    existing ones. Must be called inside an app context
+    """
+    add_missing_tables_and_columns()
+    backfill_lookup_keys()
+    fingerprinted, removed = dedupe_events()
+    if removed:
+        print("removed %d duplicate events" % removed)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('DROP INDEX IF EXISTS "%s"' % BACKFILL_INDEX)
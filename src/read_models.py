@@ -0,0 +1,105 @@
+"""
+Read model file
+
+Lightweight, read-only records for the listing endpoints. Rows are selected as
+plain column tuples through SQLAlchemy Core, skipping ORM hydration (identity
+map entries, instrumentation state) for objects that are only serialized.
+"""
+
+import datetime
+from collections import namedtuple
+from sqlalchemy import func, literal, select, union_all
+from db import db
+from db import Event
+from db import User
+from db import slugify
+
+EVENT_FIELDS = ("id", "title", "address", "start", "end", "description", "host", "host_email", "free", "category", "recurrence")
+USER_FIELDS = ("id", "name", "netid", "email")
+
+
+class EventRecord(namedtuple("EventRecord", EVENT_FIELDS)):
+    """
+    Read-only Event row
+    """
+    __slots__ = ()
+
+    def serialize(self):
+        """
+        Serializes an EventRecord the same way as Event.serialize
+        """
+        return dict(zip(EVENT_FIELDS, self))
+
+
+class UserRecord(namedtuple("UserRecord", USER_FIELDS)):
+    """
+    Read-only User row
+    """
+    __slots__ = ()
+
+    def serialize(self):
+        """
+        Serializes a UserRecord the same way as User.serialize
+        """
+        return dict(zip(USER_FIELDS, self))
+
+
+def _columns(model, fields):
+    table = model.__table__
+    return [table.c[name] for name in fields]
+
+
+def events(*criteria, limit=None):
+    """
+    Returns EventRecords for the events matching criteria (Core expressions
+    on Event columns), in id order, at most limit of them
+    """
+    query = select(*_columns(Event, EVENT_FIELDS)).where(*criteria).order_by(Event.__table__.c.id).limit(limit)
+    return [EventRecord._make(row) for row in db.session.execute(query)]
+
+
+def users(*criteria):
+    """
+    Returns UserRecords for the users matching criteria, in id order
+    """
+    query = select(*_columns(User, USER_FIELDS)).where(*criteria).order_by(User.__table__.c.id)
+    return [UserRecord._make(row) for row in db.session.execute(query)]
+
+
+def event_criteria(categories=None, host=None, free=None, start_day=None, end_day=None):
+    """
+    Returns Core criteria on Event columns for the given filters. Dates are
+    datetime.date objects and the day range is inclusive
+    """
+    criteria = []
+    if categories:
+        criteria.append(Event.category.in_(categories))
+    if host is not None:
+        criteria.append(Event.host_slug == slugify(host))
+    if free is not None:
+        criteria.append(Event.free == free)
+    if start_day is not None:
+        criteria.append(Event.start >= datetime.datetime.combine(start_day, datetime.time()))
+    if end_day is not None:
+        criteria.append(Event.start < datetime.datetime.combine(end_day + datetime.timedelta(days=1), datetime.time()))
+    return criteria
+
+
+def event_facets(*criteria):
+    """
+    Returns event counts per category, free vs. paid and per day for the
+    events matching criteria, computed by one UNION ALL of grouped aggregates
+    """
+    day = func.date(Event.start)
+    query = union_all(
+        select(literal("category"), Event.category, func.count()).where(*criteria).group_by(Event.category),
+        select(literal("free"), Event.free, func.count()).where(*criteria).group_by(Event.free),
+        select(literal("day"), day, func.count()).where(*criteria).group_by(day)
+    )
+    facets = {"category": {}, "free": {"free": 0, "paid": 0}, "day": {}}
+    for facet, value, count in db.session.execute(query):
+        if facet == "free":
+            facets["free"]["free" if value else "paid"] += count
+        else:
+            facets[facet][value] = count
+    return facets
@@ -0,0 +1,182 @@
+"""
+Recurring event helper file
+
+A recurring event is stored once, with an RRULE-style rule such as
+"FREQ=WEEKLY;INTERVAL=1;COUNT=12" or "FREQ=DAILY;UNTIL=20230501". Occurrences
+are never stored; they are generated lazily for the window a query asks for,
+and each (event, window) expansion is kept in a bounded cache.
+
+Supported rule parts: FREQ (DAILY or WEEKLY), INTERVAL, COUNT and UNTIL
+(YYYYMMDD or YYYYMMDDTHHMMSS, inclusive).
+"""
+
+import datetime
+from collections import namedtuple
+from cache import BoundedCache
+from db import Event
+import intervals
+import read_models
+
+FREQUENCIES = {"DAILY": 1, "WEEKLY": 7}
+
+Rule = namedtuple("Rule", ["freq", "interval", "count", "until"])
+
+# expanded occurrences keyed by (event id, rule, start, end, window)
+expansions = BoundedCache(max_size=512)
+
+
+def parse_rule(text):
+    """
+    Parses an RRULE-style string into a Rule. Raises ValueError if it is
+    malformed or uses unsupported parts
+    """
+    parts = {}
+    for part in text.upper().strip().split(";"):
+        if not part:
+            continue
+        name, _, value = part.partition("=")
+        parts[name] = value
+
+    unsupported = set(parts) - {"FREQ", "INTERVAL", "COUNT", "UNTIL"}
+    if unsupported:
+        raise ValueError("Unsupported recurrence parts: %s" % ", ".join(sorted(unsupported)))
+    if parts.get("FREQ") not in FREQUENCIES:
+        raise ValueError("FREQ must be DAILY or WEEKLY")
+    if "COUNT" in parts and "UNTIL" in parts:
+        raise ValueError("COUNT and UNTIL cannot be combined")
+
+    interval = int(parts.get("INTERVAL", 1))
+    count = int(parts["COUNT"]) if "COUNT" in parts else None
+    if interval < 1 or (count is not None and count < 1):
+        raise ValueError("INTERVAL and COUNT must be positive")
+    until = None
+    if "UNTIL" in parts:
+        value = parts["UNTIL"].rstrip("Z")
+        until = datetime.datetime.strptime(value, "%Y%m%dT%H%M%S" if "T" in value else "%Y%m%d")
+        if "T" not in value:
+            until += datetime.timedelta(days=1) - datetime.timedelta(microseconds=1)
+    return Rule(parts["FREQ"], interval, count, until)
+
+
+def step(rule):
+    """
+    Returns the time between two occurrences of rule
+    """
+    return datetime.timedelta(days=FREQUENCIES[rule.freq] * rule.interval)
+
+
+def last_start(start, rule):
+    """
+    Returns the start of the last occurrence, or None if the rule is unbounded
+    """
+    if rule.count is not None:
+        return start + (rule.count - 1) * step(rule)
+    if rule.until is not None:
+        if rule.until < start:
+            return start
+        return start + ((rule.until - start) // step(rule)) * step(rule)
+    return None
+
+
+def occurrences(start, end, rule, window_start, window_end):
+    """
+    Lazily yields the (start, end) of each occurrence starting inside
+    [window_start, window_end), skipping straight to the first one in the
+    window instead of walking the series from its beginning
+    """
+    interval = step(rule)
+    duration = end - start
+    n = max(0, -((start - window_start) // interval))
+    while rule.count is None or n < rule.count:
+        occurrence = start + n * interval
+        if occurrence >= window_end or (rule.until is not None and occurrence > rule.until):
+            return
+        yield occurrence, occurrence + duration
+        n += 1
+
+
+def expand(event, window_start, window_end):
+    """
+    Returns the occurrences of a recurring event record in a window, from the
+    expansion cache when possible
+    """
+    key = (event.id, event.recurrence, event.start, event.end, window_start, window_end)
+    cached = expansions.get(key)
+    if cached is None:
+        rule = parse_rule(event.recurrence)
+        cached = tuple(occurrences(event.start, event.end, rule, window_start, window_end))
+        expansions.set(key, cached)
+    return cached
+
+
+def series_in_window(window_start, window_end, *criteria):
+    """
+    Returns the records of recurring events with occurrences that may start
+    inside [window_start, window_end). Unbounded and bounded series are read
+    separately so both reads are range searches on ix_event_series
+    """
+    unbounded = read_models.events(
+        Event.recurrence.isnot(None), Event.recurrence_end.is_(None), Event.start < window_end, *criteria
+    )
+    bounded = read_models.events(
+        Event.recurrence.isnot(None), Event.recurrence_end >= window_start, Event.start < window_end, *criteria
+    )
+    return unbounded + bounded
+
+
+def occurrences_in_window(window_start, window_end, *criteria):
+    """
+    Returns serialized occurrences of recurring events that start inside
+    [window_start, window_end), unordered. Occurrences keep the id of their
+    event
+    """
+    results = []
+    for event in series_in_window(window_start, window_end, *criteria):
+        for occurrence_start, occurrence_end in expand(event, window_start, window_end):
+            serialized = event.serialize()
+            serialized["start"] = occurrence_start
+            serialized["end"] = occurrence_end
+            results.append(serialized)
+    return results
+
+
+def events_in_window(window_start, window_end, *criteria):
+    """
+    Returns serialized events and occurrences of recurring events that start
+    inside [window_start, window_end), ordered by start. Occurrences keep the
+    id of their event
+    """
+    single = read_models.events(
+        Event.recurrence.is_(None), Event.start >= window_start, Event.start < window_end, *criteria
+    )
+    results = [event.serialize() for event in single]
+    results.extend(occurrences_in_window(window_start, window_end, *criteria))
+    results.sort(key=lambda event: (event["start"], event["id"]))
+    return results
+
+
+def series_conflicts(address, start, end):
+    """
+    Returns serialized occurrences of recurring events at the same
+    (normalized) address that overlap [start, end). The interval index only
+    holds the first occurrence of a series, so bookings are checked against
+    later occurrences here, expanding only the series whose box in the
+    series R*Tree reaches the booking. (A new series is only checked on its
+    first occurrence)
+    """
+    ids = intervals.find_series(address, start, end)
+    if not ids:
+        return []
+    start, end = intervals.parse_time(start), intervals.parse_time(end)
+    normalized = intervals.normalize_address(address)
+    results = []
+    for event in read_models.events(Event.id.in_(ids)):
+        if intervals.normalize_address(event.address) != normalized:
+            continue
+        for occurrence_start, occurrence_end in expand(event, start - (event.end - event.start), end):
+            if occurrence_start < end and occurrence_end > start:
+                serialized = event.serialize()
+                serialized["start"] = occurrence_start
+                serialized["end"] = occurrence_end
+                results.append(serialized)
+    return results
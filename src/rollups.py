@@ -0,0 +1,93 @@
+"""
+Daily event count rollup
+
+Keeps daily_event_count (events starting per day and category) up to date as
+events are created, deleted or re-categorized, so a month of the calendar is
+one indexed range read instead of a scan of the event table. Recurring events
+are not rolled up; their occurrences are expanded per month on read.
+"""
+
+import calendar
+import datetime
+from sqlalchemy import select, text
+from sqlalchemy.dialects.sqlite import insert
+from db import db
+from db import DailyEventCount
+import intervals
+import recurrence
+
+
+def adjust(start, category, delta):
+    """
+    Adds delta to the count of the day of start for category, in the current
+    transaction
+    """
+    day = intervals.parse_time(start).date()
+    statement = insert(DailyEventCount.__table__).values(day=day, category=category or "", count=delta)
+    statement = statement.on_conflict_do_update(
+        index_elements=["day", "category"],
+        set_={"count": DailyEventCount.__table__.c.count + delta}
+    )
+    db.session.execute(statement)
+
+
+def event_added(event):
+    """
+    Counts a new Event (no-op for recurring events)
+    """
+    if not event.recurrence:
+        adjust(event.start, event.category, 1)
+
+
+def event_removed(event):
+    """
+    Uncounts a deleted Event (no-op for recurring events)
+    """
+    if not event.recurrence:
+        adjust(event.start, event.category, -1)
+
+
+def rebuild_if_empty():
+    """
+    Fills the rollup from the event table if it is empty. Must be called
+    inside an app context
+    """
+    if db.session.query(DailyEventCount.day).first() is not None:
+        return
+    db.session.execute(text(
+        "INSERT INTO daily_event_count (day, category, count) "
+        "SELECT date(start), coalesce(category, ''), count(*) FROM event "
+        "WHERE recurrence IS NULL GROUP BY date(start), coalesce(category, '')"
+    ))
+    db.session.commit()
+
+
+def month_counts(year, month, by_category=False):
+    """
+    Returns {"YYYY-MM-DD": count} (or {"YYYY-MM-DD": {category: count}} when
+    by_category) for every day of the month that has events
+    """
+    first = datetime.date(year, month, 1)
+    last = datetime.date(year, month, calendar.monthrange(year, month)[1])
+    rows = db.session.execute(
+        select(DailyEventCount.day, DailyEventCount.category, DailyEventCount.count)
+        .where(DailyEventCount.day >= first, DailyEventCount.day <= last, DailyEventCount.count > 0)
+    ).all()
+
+    window_start = datetime.datetime.combine(first, datetime.time())
+    window_end = window_start + datetime.timedelta(days=(last - first).days + 1)
+    occurrences = [
+        (event["start"].date(), event["category"] or "")
+        for event in recurrence.occurrences_in_window(window_start, window_end)
+    ]
+
+    days = {}
+    for day, category, count in list(rows) + [(day, category, 1) for day, category in occurrences]:
+        key = day.isoformat()
+        if by_category:
+            label = category or "uncategorized"
+            days.setdefault(key, {})
+            days[key][label] = days[key].get(label, 0) + count
+        else:
+            days[key] = days.get(key, 0) + count
+    return dict(sorted(days.items()))
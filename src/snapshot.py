@@ -0,0 +1,213 @@
+"""
+Snapshot tool for cms.db
+
+Takes consistent online backups of the live database, exports the event/user/
+category/subscription tables to a compressed column-oriented file, and bulk
+restores such an export into another database.
+
+Usage:
+    python snapshot.py backup staging.db
+    python snapshot.py export cms-export.json.gz
+    python snapshot.py --db staging.db restore cms-export.json.gz
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "cms.db")
+TABLES = ["category", "user", "event", "subscription"]
+# rebuilt from the restored rows by `python app.py init-db`
+DERIVED_TABLES = ["event_interval", "event_series_interval", "daily_event_count"]
+# view/click counts and the change log are not exported; they describe the
+# replaced rows, so they are emptied on restore
+RESET_TABLES = ["event_stats", "change_log"]
+# tables pointing at rows of other tables by id, emptied when an export
+# without them replaces the rows they point at
+DEPENDENT_TABLES = {"subscription": ["user", "category"]}
+EXPORT_VERSION = 1
+
+
+def backup(source_path, dest_path, pages=256, pause=0.005):
+    """
+    Copies source_path into dest_path with the SQLite online backup API
+
+    The copy is done `pages` pages at a time, sleeping `pause` seconds between
+    steps so writers on the live database can take the lock in between. If the
+    source is written to during the backup, SQLite restarts the copy, so the
+    result is always a consistent snapshot.
+    """
+    def progress(status, remaining, total):
+        print("copied %d/%d pages" % (total - remaining, total), file=sys.stderr)
+
+    source = sqlite3.connect(source_path)
+    dest = sqlite3.connect(dest_path)
+    try:
+        source.backup(dest, pages=pages, progress=progress, sleep=pause)
+    finally:
+        dest.close()
+        source.close()
+
+
+def export_tables(source_path, dest_path, tables=TABLES):
+    """
+    Exports tables from source_path into a gzipped JSON file at dest_path
+
+    Each table is stored column by column ({column: [values...]}) together
+    with its CREATE statements, which compresses much better than one object
+    per row. Blob values (bcrypt password digests) are stored base64 encoded
+    and their columns listed under "binary". The export runs inside a single
+    read transaction.
+    """
+    conn = sqlite3.connect(source_path)
+    try:
+        conn.execute("BEGIN")
+        export = {"version": EXPORT_VERSION, "tables": {}}
+        for table in tables:
+            schema = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()
+            if schema is None:
+                continue
+            indexes = [row[0] for row in conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (table,)
+            )]
+            cursor = conn.execute('SELECT * FROM "%s"' % table)
+            columns = [description[0] for description in cursor.description]
+            values = [[] for _ in columns]
+            binary = set()
+            for row in cursor:
+                for i, value in enumerate(row):
+                    if isinstance(value, bytes):
+                        binary.add(columns[i])
+                        value = base64.b64encode(value).decode("ascii")
+                    values[i].append(value)
+            export["tables"][table] = {
+                "schema": schema[0],
+                "indexes": indexes,
+                "columns": dict(zip(columns, values)),
+                "binary": sorted(binary)
+            }
+        conn.rollback()
+    finally:
+        conn.close()
+
+    with gzip.open(dest_path, "wt", encoding="utf8") as f:
+        json.dump(export, f, separators=(",", ":"))
+
+
+def restore(source_path, dest_path, batch_size=5000):
+    """
+    Bulk loads an export made by export_tables into the database at dest_path
+
+    Existing rows in the exported tables are replaced. Explicit indexes are
+    dropped for the duration of the load and rebuilt afterwards, and the whole
+    load runs in one transaction with synchronous writes turned off.
+    (Indexes SQLite creates for UNIQUE constraints cannot be dropped and are
+    maintained during the load.) Derived tables (the event interval indexes and
+    daily counts) are emptied; `python app.py init-db` refills them. Event
+    stats and the change log are emptied too, so change log consumers must
+    resync from scratch after a restore.
+    """
+    with gzip.open(source_path, "rt", encoding="utf8") as f:
+        export = json.load(f)
+    if export.get("version") != EXPORT_VERSION:
+        raise ValueError("Unsupported export version: %s" % export.get("version"))
+
+    conn = sqlite3.connect(dest_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("BEGIN IMMEDIATE")
+
+        rebuild = []
+        for table, data in export["tables"].items():
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()
+            if exists is None:
+                conn.execute(data["schema"])
+                rebuild.extend(data["indexes"])
+            for name, sql in conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (table,)
+            ).fetchall():
+                conn.execute('DROP INDEX "%s"' % name)
+                rebuild.append(sql)
+            conn.execute('DELETE FROM "%s"' % table)
+
+            columns = list(data["columns"])
+            for column in data.get("binary", []):
+                data["columns"][column] = [
+                    base64.b64decode(value) if value is not None else None
+                    for value in data["columns"][column]
+                ]
+            rows = list(zip(*data["columns"].values()))
+            insert = 'INSERT INTO "%s" (%s) VALUES (%s)' % (
+                table,
+                ", ".join('"%s"' % column for column in columns),
+                ", ".join("?" for _ in columns)
+            )
+            for i in range(0, len(rows), batch_size):
+                conn.executemany(insert, rows[i:i + batch_size])
+
+        for sql in rebuild:
+            conn.execute(sql)
+        # derived indexes are refilled from the restored rows by `python app.py init-db`;
+        # subscriptions are dropped along with the rows an older export replaces
+        cleared = DERIVED_TABLES + RESET_TABLES + [
+            table for table, parents in DEPENDENT_TABLES.items()
+            if table not in export["tables"] and set(parents) & set(export["tables"])
+        ]
+        for table in cleared:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()
+            if exists is not None:
+                conn.execute('DELETE FROM "%s"' % table)
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot, export and restore cms.db")
+    parser.add_argument("--db", default=DEFAULT_DB, help="path to the live database (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backup_parser = commands.add_parser("backup", help="take a consistent online snapshot")
+    backup_parser.add_argument("dest")
+    backup_parser.add_argument("--pages", type=int, default=256, help="pages copied per step")
+    backup_parser.add_argument("--pause", type=float, default=0.005, help="seconds to sleep between steps")
+
+    export_parser = commands.add_parser("export", help="export tables to a compressed file")
+    export_parser.add_argument("dest")
+    export_parser.add_argument("--tables", nargs="+", default=TABLES)
+
+    restore_parser = commands.add_parser("restore", help="bulk load an export into --db")
+    restore_parser.add_argument("source")
+
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    if args.command == "backup":
+        backup(args.db, args.dest, pages=args.pages, pause=args.pause)
+    elif args.command == "export":
+        export_tables(args.db, args.dest, tables=args.tables)
+    elif args.command == "restore":
+        restore(args.source, args.db)
+    print("%s finished in %.2fs" % (args.command, time.perf_counter() - started), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
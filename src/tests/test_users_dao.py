@@ -0,0 +1,91 @@
+"""
+Tests for users_dao email lookups
+
+Run from src/:
+    python -m unittest discover tests
+"""
+
+import datetime
+import os
+import tempfile
+import unittest
+
+import bcrypt
+
+import app
+import migrations
+import users_dao
+from db import db
+from db import User
+
+
+def user_row(user_id, email, password):
+    """
+    Returns a user row as written before email_key existed
+    """
+    return {
+        "id": user_id,
+        "email": email,
+        "email_key": None,
+        "password_digest": bcrypt.hashpw(password.encode("utf8"), bcrypt.gensalt(4)),
+        "name": "User %d" % user_id,
+        "netid": "user%d" % user_id,
+        "session_token": "session%d" % user_id,
+        "session_expiration": datetime.datetime.now() + datetime.timedelta(days=1),
+        "update_token": "update%d" % user_id
+    }
+
+
+class CollidingEmailTest(unittest.TestCase):
+    """
+    Two legacy users whose emails only differ in case
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app = app.create_app({
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///%s" % os.path.join(self.tmp.name, "cms.db"),
+            "SQLALCHEMY_ECHO": False
+        })
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            user_row(1, "Foo@x.com", "first"),
+            user_row(2, "foo@x.com", "second")
+        ])
+        db.session.commit()
+        migrations.upgrade()
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.context.pop()
+        self.tmp.cleanup()
+
+    def test_backfill_leaves_colliding_user_unkeyed(self):
+        self.assertEqual(db.session.get(User, 1).email_key, "foo@x.com")
+        self.assertIsNone(db.session.get(User, 2).email_key)
+
+    def test_exact_email_finds_each_user(self):
+        self.assertEqual(users_dao.get_user_by_email("Foo@x.com").id, 1)
+        self.assertEqual(users_dao.get_user_by_email("foo@x.com").id, 2)
+
+    def test_other_case_falls_back_to_email_key(self):
+        self.assertEqual(users_dao.get_user_by_email("FOO@X.COM").id, 1)
+
+    def test_colliding_user_logs_in_to_own_account(self):
+        success, user = users_dao.verify_credentials("foo@x.com", "second")
+        self.assertTrue(success)
+        self.assertEqual(user.id, 2)
+        success, user = users_dao.verify_credentials("foo@x.com", "first")
+        self.assertFalse(success)
+
+    def test_register_with_existing_email_in_other_case_is_rejected(self):
+        created, user = users_dao.create_user("FOO@x.com", "third", "Third", "user3")
+        self.assertFalse(created)
+        self.assertEqual(user.id, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,13 +6,21 @@ Helper file containing functions for accessing data in our database
 
 from db import db
 from db import User
+from db import canonical_email
+import changelog
 
 
 def get_user_by_email(email):
     """
-    Returns a user object from the database given an email
+    Returns a user object from the database given an email. An exact match
+    wins; otherwise the email is matched case-insensitively. (Users whose
+    email only differs in case from another user's have no email_key and are
+    only found by exact match)
     """
-    return User.query.filter(User.email == email).first()
+    user = User.query.filter(User.email == email).first()
+    if user is None:
+        user = User.query.filter(User.email_key == canonical_email(email)).first()
+    return user
 
 
 def get_user_by_session_token(session_token):
@@ -56,14 +64,16 @@ def create_user(email, password, name, netid):
     user = User(email=email, password=password, name=name, netid=netid)
 
     db.session.add(user)
+    db.session.flush()
+    changelog.record(User.__tablename__, user.id, changelog.UPSERT, user.serialize())
     db.session.commit()
 
     return True, user
 
 
-def renew_session(update_token):
+def renew_session(update_token, commit=True):
     """
-    Renews a user's session token
+    Renews a user's session token (without committing if commit is False)
     
     Returns the User object
     """
@@ -74,5 +84,6 @@ def renew_session(update_token):
         return None
     
     user.renew_session()
-    db.session.commit()
+    if commit:
+        db.session.commit()
     return user